@@ -0,0 +1,226 @@
+"""
+Rate limiting and admission control.
+RateLimitMiddleware gives each client a token bucket per route class:
+logins and registrations per IP and submitted email or username (with a
+much larger bucket for the IP as a whole, since campus NAT puts a whole
+dorm behind one address), and complaint submission, notification polling
+and the rest of the API per user (per IP when anonymous). Buckets live in
+the shared state store (see shared_state.py), so limits hold across
+workers. ConcurrencyLimitMiddleware caps the API requests a worker serves at
+once; extra requests wait up to ADMISSION_WAIT seconds for a slot and are
+then shed. Notification streams would hold a slot for their whole lifetime,
+so instead each user may keep MAX_STREAMS_PER_USER of them open per worker.
+Both reject before a handler runs, so no database session is opened for a
+request that is turned away.
+
+Limits are "<requests>/<seconds>", e.g. RATE_LIMIT_LOGIN=10/60 allows a
+burst of 10 and refills the bucket over a minute; "0" disables a class.
+RATE_LIMITS=0 disables rate limiting altogether.
+"""
+import asyncio
+import json
+import math
+import os
+import re
+from collections import Counter
+from urllib.parse import parse_qs
+from starlette.datastructures import Headers
+
+from auth import decode_token, decode_stream_ticket
+import metrics
+from responses import FastJSONResponse
+from shared_state import get_state, call
+
+RATE_LIMITS = os.getenv("RATE_LIMITS", "1") == "1"
+# Take the client address from X-Forwarded-For (only behind a trusted proxy)
+TRUST_FORWARDED = os.getenv("TRUST_FORWARDED", "0") == "1"
+
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "64"))   # per worker, 0 = unlimited
+ADMISSION_WAIT = float(os.getenv("ADMISSION_WAIT", "2"))   # seconds
+SHED_RETRY_AFTER = 1   # seconds
+
+# Long-lived streams: capped per user rather than holding a concurrency slot
+STREAM_PATHS = {"/api/notifications/stream"}
+MAX_STREAMS_PER_USER = int(os.getenv("MAX_STREAMS_PER_USER", "3"))   # per worker, 0 = unlimited
+
+# Login bodies are small; only this much is read to find the account
+LOGIN_BODY_PEEK = 4096
+
+
+def _limit(name: str, default: str) -> tuple[float, float] | None:
+    """(rate per second, burst) from RATE_LIMIT_<NAME>, or None when disabled."""
+    value = os.getenv(f"RATE_LIMIT_{name.upper()}", default)
+    if value == "0":
+        return None
+    count, _, seconds = value.partition("/")
+    return float(count) / float(seconds), float(count)
+
+
+# (class, methods, path pattern, keyed by user when authenticated); first match wins
+ROUTE_CLASSES = [
+    ("login", {"POST"}, re.compile(r"^/api/auth/(login|admin/login|register)$"), False),
+    ("submit", {"POST"}, re.compile(r"^/api/complaints$"), True),
+    ("poll", {"GET"}, re.compile(r"^/api/notifications(/unread-count)?$"), True),
+    ("api", None, re.compile(r"^/api/"), True),
+]
+LIMITS = {
+    "login": _limit("login", "10/60"),          # per IP and account
+    "login_ip": _limit("login_ip", "300/60"),   # per IP, across accounts
+    "submit": _limit("submit", "10/600"),
+    "poll": _limit("poll", "30/60"),
+    "api": _limit("api", "300/60"),
+}
+
+
+def route_class(method: str, path: str) -> tuple[str, bool] | None:
+    for name, methods, pattern, per_user in ROUTE_CLASSES:
+        if (methods is None or method in methods) and pattern.match(path):
+            return name, per_user
+    return None
+
+
+def client_ip(scope) -> str:
+    if TRUST_FORWARDED:
+        forwarded = Headers(scope=scope).get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _client_key(scope, per_user: bool) -> str:
+    """user:<sub> for a valid bearer token when per_user, else ip:<address>.
+    Only the signature is checked; the endpoint still authenticates."""
+    if per_user:
+        auth = Headers(scope=scope).get("authorization", "")
+        if auth.lower().startswith("bearer "):
+            payload = decode_token(auth[7:])
+            if payload and payload.get("sub"):
+                return f"user:{payload['sub']}"
+    return f"ip:{client_ip(scope)}"
+
+
+async def _login_account(receive):
+    """The email or username a login or registration body names ("" if none), and a
+    receive callable that replays the body to the app."""
+    body, more, pending = b"", True, None
+    while more and len(body) <= LOGIN_BODY_PEEK:
+        message = await receive()
+        if message["type"] != "http.request":
+            pending = message   # the client went away
+            break
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    queued = [{"type": "http.request", "body": body, "more_body": more or pending is not None}]
+    if pending is not None:
+        queued.append(pending)
+
+    async def replay():
+        return queued.pop(0) if queued else await receive()
+
+    account = ""
+    if not more:
+        try:
+            payload = json.loads(body)
+            account = str(payload.get("email") or payload.get("username") or "")
+        except (ValueError, AttributeError):
+            pass
+    return account.strip().lower()[:254], replay
+
+
+def _stream_client_key(scope) -> str:
+    """user:<id> for a genuine stream ticket, else ip:<address>. The endpoint redeems it."""
+    ticket = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("ticket", [""])[0]
+    payload = decode_stream_ticket(ticket) if ticket else None
+    if payload and payload.get("sub"):
+        return f"user:{payload['sub']}"
+    return f"ip:{client_ip(scope)}"
+
+
+def _reject(status: int, detail: str, retry_after: float, reason: str, cls: str) -> FastJSONResponse:
+    metrics.registry.inc("scms_requests_shed_total", "Requests rejected by admission control.",
+                         reason=reason, route_class=cls)
+    return FastJSONResponse(
+        {"detail": detail}, status_code=status,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMITS or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        matched = route_class(scope["method"], scope["path"])
+        if matched is None:
+            return await self.app(scope, receive, send)
+        cls, per_user = matched
+        client = _client_key(scope, per_user)
+        if cls == "login":
+            buckets = [("login_ip", f"rl:login_ip:{client}"), ("login", None)]
+        else:
+            buckets = [(cls, f"rl:{cls}:{client}")]
+        buckets = [(name, key) for name, key in buckets if LIMITS.get(name)]
+        if not buckets:
+            return await self.app(scope, receive, send)
+
+        for name, key in buckets:
+            if key is None:   # the login bucket is per account, which is in the body
+                account, receive = await _login_account(receive)
+                key = f"rl:login:{client}:{account}"
+            rate, burst = LIMITS[name]
+            wait = await call(get_state().take, key, rate, burst)
+            if wait:
+                response = _reject(429, "Too many requests. Please try again later.", wait, "rate_limit", cls)
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+class ConcurrencyLimitMiddleware:
+    def __init__(self, app, limit: int = MAX_CONCURRENT_REQUESTS, wait: float = ADMISSION_WAIT,
+                 streams: int = MAX_STREAMS_PER_USER):
+        self.app = app
+        self.limit = limit
+        self.wait = wait
+        self.streams = streams
+        self._slots = None   # created on first use, inside the server's event loop
+        self._open_streams: Counter = Counter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            return await self.app(scope, receive, send)
+        if scope["path"] in STREAM_PATHS:
+            return await self._stream(scope, receive, send)
+        if not self.limit:
+            return await self.app(scope, receive, send)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.limit)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.wait)
+        except asyncio.TimeoutError:
+            matched = route_class(scope["method"], scope["path"])
+            response = _reject(503, "Server is busy. Please try again shortly.", SHED_RETRY_AFTER,
+                               "overloaded", matched[0] if matched else "other")
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+    async def _stream(self, scope, receive, send):
+        if not self.streams:
+            return await self.app(scope, receive, send)
+        key = _stream_client_key(scope)
+        # No await between the check and the increment, so the cap is exact within a worker
+        if self._open_streams[key] >= self.streams:
+            response = _reject(429, "Too many open notification streams.", SHED_RETRY_AFTER, "streams", "stream")
+            return await response(scope, receive, send)
+        self._open_streams[key] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._open_streams[key] -= 1
+            if not self._open_streams[key]:
+                del self._open_streams[key]
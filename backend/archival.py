@@ -0,0 +1,115 @@
+"""
+Complaint archival.
+Complaints resolved more than COMPLAINT_ARCHIVE_DAYS ago (by their last
+update) are moved, with their comments, to complaints_archive and
+comments_archive, in batches of COMPLAINT_ARCHIVE_BATCH so the write lock
+is never held for long. Their notifications go to notifications_archive.
+List, search and export queries then only scan live tickets; archived ones
+stay readable through the detail endpoint and ?include_archived=true.
+Statistics counters are left alone, so totals still include archived
+complaints. Runs as a periodic background job; set COMPLAINT_ARCHIVE_DAYS=0
+to keep everything live.
+"""
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, func, case, literal, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from database import (
+    Complaint, Comment, Notification, User, ComplaintArchive, CommentArchive,
+)
+from retention import archive_notifications
+import jobs
+import metrics
+
+COMPLAINT_ARCHIVE_DAYS = float(os.getenv("COMPLAINT_ARCHIVE_DAYS", "365"))
+COMPLAINT_ARCHIVE_BATCH = int(os.getenv("COMPLAINT_ARCHIVE_BATCH", "500"))
+COMPLAINT_ARCHIVE_INTERVAL = float(os.getenv("COMPLAINT_ARCHIVE_INTERVAL", "86400"))   # seconds
+
+COMPLAINT_COLUMNS = [
+    "id", "ticket_id", "student_id", "category", "building", "room_number", "description",
+    "image_url", "status", "assigned_to", "assigned_staff_id", "admin_comment", "created_at", "updated_at",
+]
+COMMENT_COLUMNS = ["complaint_id", "author", "text", "created_at"]
+
+SIZED_TABLES = (Complaint, Comment, Notification, ComplaintArchive, CommentArchive)
+
+
+def _archive_batch(db: Session, ids: list[int]):
+    now = datetime.utcnow()
+    db.execute(insert(ComplaintArchive).from_select(
+        COMPLAINT_COLUMNS + ["archived_at"],
+        select(*(getattr(Complaint, c) for c in COMPLAINT_COLUMNS), literal(now))
+        .where(Complaint.id.in_(ids)),
+    ))
+    db.execute(insert(CommentArchive).from_select(
+        COMMENT_COLUMNS,
+        select(*(getattr(Comment, c) for c in COMMENT_COLUMNS))
+        .where(Comment.complaint_id.in_(ids)).order_by(Comment.id),
+    ))
+
+    # Notifications follow their complaint; unread ones leave the badge count
+    unread = Counter(db.scalars(
+        select(Notification.user_id).where(Notification.complaint_id.in_(ids), Notification.is_read == False)
+    ))
+    for user_id, n in unread.items():
+        db.execute(
+            update(User).where(User.id == user_id)
+            .values(unread_notifications=case(
+                (User.unread_notifications > n, User.unread_notifications - n), else_=0,
+            ))
+        )
+    archive_notifications(db, Notification.complaint_id.in_(ids))
+
+    db.execute(delete(Notification).where(Notification.complaint_id.in_(ids)))
+    db.execute(delete(Comment).where(Comment.complaint_id.in_(ids)))
+    db.execute(delete(Complaint).where(Complaint.id.in_(ids)))
+
+
+def archive(db: Session, days: float = COMPLAINT_ARCHIVE_DAYS, batch: int = COMPLAINT_ARCHIVE_BATCH) -> int:
+    """Move old resolved complaints to the archive, committing per batch. Returns complaints moved."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    # SQLite hands out max(id) + 1, so the newest row stays to keep archived ids from being reused
+    newest = db.scalar(select(func.max(Complaint.id))) or 0
+    total = 0
+    while True:
+        ids = db.scalars(
+            select(Complaint.id)
+            .where(Complaint.status == "Resolved", Complaint.updated_at < cutoff, Complaint.id < newest)
+            .order_by(Complaint.id)
+            .limit(batch)
+        ).all()
+        if not ids:
+            return total
+        _archive_batch(db, ids)
+        jobs.renew_lease(db)
+        db.commit()
+        total += len(ids)
+        metrics.registry.inc("scms_complaints_archived_total", "Resolved complaints moved to the archive.", len(ids))
+
+
+def table_sizes(db: Session) -> dict[str, dict]:
+    """Rows per live and archive table, plus bytes on disk where SQLite's dbstat is available."""
+    sizes = {}
+    for model in SIZED_TABLES:
+        sizes[model.__tablename__] = {"rows": db.scalar(select(func.count()).select_from(model))}
+    if db.get_bind().dialect.name == "sqlite":
+        try:
+            rows = db.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).all()
+        except OperationalError:   # SQLite built without dbstat
+            return sizes
+        on_disk = dict(rows)
+        for name in sizes:
+            sizes[name]["bytes"] = on_disk.get(name, 0)
+    return sizes
+
+
+@jobs.handler("complaint-archival")
+def _archival_job(db: Session, payload: dict):
+    if COMPLAINT_ARCHIVE_DAYS > 0:
+        archive(db)
+
+
+jobs.periodic("complaint-archival", COMPLAINT_ARCHIVE_INTERVAL)
@@ -3,18 +3,50 @@ JWT token utilities and password hashing.
 Also exposes get_current_user FastAPI dependency.
 """
 import os
+import time
+import asyncio
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import Header, HTTPException, Depends
-from sqlalchemy.orm import Session
-from database import get_db, User
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, User
+from shared_state import get_state, call
 
 SECRET_KEY = os.getenv("SECRET_KEY", "scms-super-secret-key-2026")
 ALGORITHM = "HS256"
 TOKEN_EXPIRE_HOURS = 24 * 7   # 7 days
+# Single-use tickets for the notification stream, whose URL cannot carry an Authorization header
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", "60"))
+STREAM_TICKET_AUDIENCE = "notification-stream"
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated principals cached per token
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))   # seconds
+# Build the principal from the token's signed name/email/role claims, skipping the users lookup
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "0") == "1"
+
+# Hashes with any other cost are upgraded on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# bcrypt runs on its own pool so a login storm cannot starve other endpoints
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "4"))
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")     # thread | process
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+HASH_RETRY_AFTER = 2   # seconds
+
+pwd_ctx = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 
 def hash_password(plain: str) -> str:
@@ -25,6 +57,60 @@ def verify_password(plain: str, hashed: str) -> bool:
     return pwd_ctx.verify(plain, hashed)
 
 
+def verify_and_update(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """Verify a password, returning a replacement hash if the stored cost is outdated."""
+    return pwd_ctx.verify_and_update(plain, hashed)
+
+
+# ── Hashing pool ────────────────────────────────────────
+_hash_pool = None
+_hash_pending = 0
+_hash_lock = threading.Lock()
+
+
+def _get_hash_pool():
+    global _hash_pool
+    if _hash_pool is None:
+        if HASH_EXECUTOR == "process":
+            _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        else:
+            _hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _hash_pool
+
+
+async def _run_hashing(fn, *args):
+    global _hash_pending
+    with _hash_lock:
+        if _hash_pending >= HASH_QUEUE_LIMIT:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy. Please try again shortly.",
+                headers={"Retry-After": str(HASH_RETRY_AFTER)},
+            )
+        _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_pool(), fn, *args)
+    finally:
+        with _hash_lock:
+            _hash_pending -= 1
+
+
+async def hash_password_async(plain: str) -> str:
+    return await _run_hashing(hash_password, plain)
+
+
+async def verify_and_update_async(plain: str, hashed: str) -> tuple[bool, str | None]:
+    return await _run_hashing(verify_and_update, plain, hashed)
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False)
+        _hash_pool = None
+
+
 def create_token(payload: dict) -> str:
     data = payload.copy()
     data["exp"] = datetime.utcnow() + timedelta(hours=TOKEN_EXPIRE_HOURS)
@@ -38,14 +124,115 @@ def decode_token(token: str) -> dict | None:
         return None
 
 
+# ── Stream tickets ──────────────────────────────────────
+def create_stream_ticket(user_id: int) -> str:
+    """A short-lived ticket that only opens the notification stream. Its audience
+    claim makes decode_token reject it, so it cannot stand in for a session token."""
+    return jwt.encode({
+        "sub": str(user_id),
+        "aud": STREAM_TICKET_AUDIENCE,
+        "jti": uuid.uuid4().hex,
+        "exp": datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS),
+    }, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_stream_ticket(ticket: str) -> dict | None:
+    """A stream ticket's claims if it is genuine and unexpired; whether it was used is not checked."""
+    try:
+        return jwt.decode(
+            ticket, SECRET_KEY, algorithms=[ALGORITHM], audience=STREAM_TICKET_AUDIENCE,
+            options={"require_aud": True, "require_jti": True, "require_exp": True},
+        )
+    except JWTError:
+        return None
+
+
+async def redeem_stream_ticket(ticket: str) -> int:
+    """Return the user id a stream ticket was issued to, raising 401 if it is invalid,
+    expired or already used."""
+    payload = decode_stream_ticket(ticket)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    # Shared across workers, so a ticket copied from a log cannot be replayed
+    uses = await call(get_state().incr, f"stream-ticket:{payload['jti']}", STREAM_TICKET_SECONDS)
+    if uses > 1:
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    return int(payload["sub"])
+
+
+# ── Principal cache ─────────────────────────────────────
+class PrincipalCache:
+    """Bounded LRU of token -> principal dict, each entry with its own expiry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> dict | None:
+        with self._lock:
+            entry = self._data.get(token)
+            if entry and entry[0] > time.time():
+                self._data.move_to_end(token)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._data[token]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, principal: dict, token_exp: float | None = None):
+        expires = time.time() + self.ttl
+        if token_exp is not None:
+            expires = min(expires, token_exp)
+        with self._lock:
+            self._data[token] = (expires, principal)
+            self._data.move_to_end(token)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in [t for t, (_, p) in self._data.items() if p["id"] == user_id]:
+                del self._data[token]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_principals(mapper, connection, target):
+    principal_cache.invalidate_user(target.id)
+
+
 # ── FastAPI dependency ──────────────────────────────────
-def get_current_user(
+async def get_current_user(
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
     token = authorization.split(" ", 1)[1]
+    return await authenticate_token(token, db)
+
+
+async def authenticate_token(token: str, db: AsyncSession) -> dict:
+    """Resolve a bearer token to a principal dict, raising 401 if invalid."""
+    principal = principal_cache.get(token)
+    if principal:
+        return principal
+
     payload = decode_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
@@ -55,15 +242,20 @@ def get_current_user(
 
     # Admin tokens have sub="admin"
     if role == "admin":
-        return {"id": 0, "role": "admin", "name": "Administrator"}
+        principal = {"id": 0, "role": "admin", "name": "Administrator"}
+    elif TRUST_TOKEN_CLAIMS and "name" in payload and "email" in payload:
+        principal = {"id": int(sub), "role": role, "name": payload["name"], "email": payload["email"]}
+    else:
+        user = await db.get(User, int(sub))
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal = {"id": user.id, "role": user.role, "name": user.name, "email": user.email}
 
-    user = db.query(User).filter(User.id == int(sub)).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return {"id": user.id, "role": user.role, "name": user.name, "email": user.email}
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
 
 
-def require_admin(current_user: dict = Depends(get_current_user)):
+async def require_admin(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
@@ -0,0 +1,280 @@
+"""
+Load test the API with scenario mixes and compare against saved baselines.
+
+    python -m benchmarks.api_load [--scenario all] [--concurrency 16] [--seconds 10]
+    python -m benchmarks.api_load --url http://127.0.0.1:8000 --students 200
+    python -m benchmarks.api_load --save-baseline benchmarks/baselines/local.json
+    python -m benchmarks.api_load --seconds 30 --compare benchmarks/baselines/default.json --tolerance 0.5
+
+Scenarios:
+  student  log in, then submit complaints and poll complaints/notifications
+  admin    list, search, stats, trend, detail and status updates
+  login    a storm of student logins (bcrypt bound)
+  all      the three mixed across the virtual users
+
+By default the real app runs in-process on a freshly seeded temporary
+database, and each request's SQL statements are counted. With --url the
+suite drives a running server over HTTP instead; seed its database first
+with benchmarks.seed using the same --students and start it with
+RATE_LIMITS=0, and SQL counts are not available. --compare exits 1 when an endpoint's p95 latency or SQL count
+grows, or overall throughput drops, by more than --tolerance.
+
+benchmarks/baselines/default.json is the committed baseline; its "command"
+field is the exact command line that saved it. Write latencies under SQLite
+lock contention vary by about a third between runs, hence --tolerance 0.5
+above. Latencies also depend on the machine, so save a local baseline on
+the machine you compare on; SQL counts carry over.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+SQL_HEADER = "x-bench-sql"
+SCENARIOS = ("student", "admin", "login")
+
+_sql_count: contextvars.ContextVar = contextvars.ContextVar("bench_sql_count", default=None)
+
+
+# ── Recording ───────────────────────────────────────────
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.sql = defaultdict(list)
+
+    def add(self, label: str, seconds: float, response: httpx.Response):
+        self.latencies[label].append(seconds)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        if SQL_HEADER in response.headers:
+            self.sql[label].append(int(response.headers[SQL_HEADER]))
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            pct = lambda p: values[min(len(values) - 1, int(p * len(values)))] * 1000
+            sql = self.sql.get(label)
+            endpoints[label] = {
+                "requests": len(values),
+                "rps": len(values) / elapsed,
+                "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99),
+                "errors": self.errors.get(label, 0),
+                "sql": sum(sql) / len(sql) if sql else None,
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {"rps": total / elapsed, "endpoints": endpoints}
+
+
+async def _call(client, rec: Recorder, label: str, method: str, url: str, **kwargs) -> httpx.Response:
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    rec.add(label, time.perf_counter() - start, response)
+    return response
+
+
+# ── Scenarios ───────────────────────────────────────────
+async def _student_login(client, rec, rng, students: int) -> dict:
+    from benchmarks.seed import student_email, BENCH_PASSWORD
+    r = await _call(client, rec, "POST /api/auth/login", "POST", "/api/auth/login",
+                    json={"email": student_email(rng.randint(1, students)), "password": BENCH_PASSWORD})
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['token']}"}
+
+
+async def student(client, rec, rng, students: int, deadline: float):
+    from benchmarks.seed import CATEGORIES, WORDS
+    from routes.complaint_routes import CAMPUS_BUILDINGS
+    headers = await _student_login(client, rec, rng, students)
+    etag = None
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        if roll < 0.1:
+            await _call(client, rec, "POST /api/complaints", "POST", "/api/complaints", headers=headers, data={
+                "category": rng.choice(CATEGORIES), "building": rng.choice(CAMPUS_BUILDINGS),
+                "room_number": str(rng.randint(1, 400)), "description": " ".join(rng.choices(WORDS, k=8)),
+            })
+        elif roll < 0.55:
+            # Polls revalidate with the last ETag, as the dashboard does
+            poll = dict(headers, **({"If-None-Match": etag} if etag else {}))
+            r = await _call(client, rec, "GET /api/complaints", "GET", "/api/complaints", headers=poll)
+            etag = r.headers.get("etag", etag)
+        else:
+            await _call(client, rec, "GET /api/notifications", "GET", "/api/notifications", headers=headers)
+
+
+async def admin(client, rec, rng, students: int, deadline: float):
+    from benchmarks.seed import WORDS
+    r = await client.post("/api/auth/admin/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {r.json()['token']}"}
+    ids = []
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        if roll < 0.3 or not ids:
+            r = await _call(client, rec, "GET /api/complaints?limit", "GET", "/api/complaints",
+                            params={"limit": 50}, headers=headers)
+            ids = [c["id"] for c in r.json()["items"]] if r.status_code == 200 else ids
+        elif roll < 0.5:
+            await _call(client, rec, "GET /api/complaints?search", "GET", "/api/complaints",
+                        params={"search": rng.choice(WORDS), "limit": 50}, headers=headers)
+        elif roll < 0.6:
+            await _call(client, rec, "GET /api/admin/stats", "GET", "/api/admin/stats", headers=headers)
+        elif roll < 0.7:
+            await _call(client, rec, "GET /api/admin/stats/trend", "GET", "/api/admin/stats/trend", headers=headers)
+        elif roll < 0.9:
+            await _call(client, rec, "GET /api/complaints/{id}", "GET", f"/api/complaints/{rng.choice(ids)}",
+                        headers=headers)
+        else:
+            await _call(client, rec, "PATCH /api/complaints/{id}/status", "PATCH",
+                        f"/api/complaints/{rng.choice(ids)}/status",
+                        json={"status": rng.choice(["Pending", "In Progress", "Resolved"])}, headers=headers)
+
+
+async def login(client, rec, rng, students: int, deadline: float):
+    while time.perf_counter() < deadline:
+        await _student_login(client, rec, rng, students)
+
+
+# ── In-process app ──────────────────────────────────────
+def _counting(app):
+    """Wrap the ASGI app so each response reports its SQL statement count."""
+    async def wrapped(scope, receive, send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
+        count = [0]
+        _sql_count.set(count)
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (SQL_HEADER.encode(), str(count[0]).encode())]
+            await send(message)
+
+        await app(scope, receive, counting_send)
+    return wrapped
+
+
+def _on_execute(*args, **kwargs):
+    count = _sql_count.get()
+    if count is not None:
+        count[0] += 1
+
+
+async def _run_clients(make_client, args) -> dict:
+    rec = Recorder()
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    runners = {"student": student, "admin": admin, "login": login}
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    async with make_client() as client:
+        await asyncio.gather(*(
+            runners[scenarios[i % len(scenarios)]](client, rec, random.Random(args.rng_seed + i), args.students, deadline)
+            for i in range(args.concurrency)
+        ))
+    return rec.report(time.perf_counter() - start)
+
+
+async def run_in_process(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app reads its database settings at import time
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["DATABASE_URL"] = url
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        # Every virtual user shares one address; measure the app, not the rate limiter
+        os.environ.setdefault("RATE_LIMITS", "0")
+        from benchmarks.seed import seed_campus
+        seed_campus(url, args.students, args.complaints)
+
+        from sqlalchemy import event
+        from database import engine, async_engine
+        from main import app
+        for eng in (engine, async_engine.sync_engine) if async_engine else (engine,):
+            event.listen(eng, "before_cursor_execute", _on_execute)
+
+        transport = httpx.ASGITransport(app=_counting(app))
+        async with app.router.lifespan_context(app):
+            report = await _run_clients(
+                lambda: httpx.AsyncClient(transport=transport, base_url="http://bench"), args)
+        if async_engine:
+            await async_engine.dispose()
+        engine.dispose()
+    return report
+
+
+async def run_http(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    return await _run_clients(
+        lambda: httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60), args)
+
+
+# ── Baselines ───────────────────────────────────────────
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `report` against `baseline`, as readable lines."""
+    problems = []
+    if report["rps"] < baseline["rps"] * (1 - tolerance):
+        problems.append(f"throughput {report['rps']:.1f} req/s < baseline {baseline['rps']:.1f}")
+    for label, base in baseline["endpoints"].items():
+        cur = report["endpoints"].get(label)
+        if cur is None:
+            continue
+        if cur["p95"] > base["p95"] * (1 + tolerance):
+            problems.append(f"{label}: p95 {cur['p95']:.1f} ms > baseline {base['p95']:.1f} ms")
+        if cur["sql"] is not None and base["sql"] is not None and cur["sql"] > base["sql"] * (1 + tolerance) + 0.5:
+            problems.append(f"{label}: {cur['sql']:.1f} SQL statements > baseline {base['sql']:.1f}")
+    return problems
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':<36}{'reqs':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'sql':>6}")
+    for label, e in report["endpoints"].items():
+        sql = f"{e['sql']:.1f}" if e["sql"] is not None else "-"
+        print(f"{label:<36}{e['requests']:>7}{e['rps']:>9.1f}{e['p50']:>9.1f}{e['p95']:>9.1f}"
+              f"{e['p99']:>9.1f}{e['errors']:>8}{sql:>6}")
+    print(f"{'total':<36}{'':>7}{report['rps']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=(*SCENARIOS, "all"), default="all")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--complaints", type=int, default=5000)
+    parser.add_argument("--rng-seed", type=int, default=1)
+    parser.add_argument("--url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--compare", metavar="FILE")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = asyncio.run(run_http(args) if args.url else run_in_process(args))
+    report["scenario"] = args.scenario
+    report["mode"] = "http" if args.url else "in-process"
+    report["command"] = " ".join(["python -m benchmarks.api_load", *sys.argv[1:]])
+    print_report(report)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if "command" in baseline:
+            print(f"baseline: {baseline['command']}")
+        problems = compare(report, baseline, args.tolerance)
+        for line in problems:
+            print("REGRESSION", line)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Request throughput of sync sessions on a threadpool (how FastAPI runs plain
+`def` handlers), async sessions on the event loop (ASYNC_DB=1), and the
+ThreadedSession async handlers get by default on SQLite (ASYNC_DB=0).
+
+    python -m benchmarks.async_vs_sync [--concurrency 32] [--seconds 5]
+
+Each simulated request either lists the newest page of complaints or, with
+probability --write-ratio, updates a complaint's status. Both modes use a
+fresh temporary database tuned as in database.make_engine().
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker, joinedload
+
+from database import Base, make_engine, make_async_engine, async_url, Complaint, ThreadedSession
+from benchmarks.db_throughput import _seed
+
+# Starlette runs sync handlers on a 40-thread pool
+THREADPOOL_SIZE = 40
+STATUSES = ["Pending", "In Progress", "Resolved"]
+
+
+def _page():
+    return (
+        select(Complaint).options(joinedload(Complaint.student))
+        .order_by(Complaint.created_at.desc(), Complaint.id.desc()).limit(50)
+    )
+
+
+def _sync_request(Session, write: bool, seeded: int):
+    with Session() as db:
+        if write:
+            db.get(Complaint, random.randint(1, seeded)).status = random.choice(STATUSES)
+            db.commit()
+        else:
+            db.scalars(_page()).all()
+
+
+async def _async_request(Session, write: bool, seeded: int):
+    async with Session() as db:
+        if write:
+            c = await db.get(Complaint, random.randint(1, seeded))
+            c.status = random.choice(STATUSES)
+            await db.commit()
+        else:
+            (await db.scalars(_page())).all()
+
+
+async def _drive(call, concurrency: int, seconds: float, write_ratio: float) -> list[float]:
+    """Run `concurrency` clients back to back for `seconds`; return latencies."""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await call(random.random() < write_ratio)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+async def run(mode: str, concurrency: int, seconds: float, write_ratio: float, seed: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        eng = make_engine(url)
+        Base.metadata.create_all(eng)
+        _seed(sessionmaker(bind=eng, autoflush=False), seed)
+
+        if mode == "sync":
+            Session = sessionmaker(bind=eng, autoflush=False)
+            pool = ThreadPoolExecutor(THREADPOOL_SIZE)
+            loop = asyncio.get_running_loop()
+
+            async def call(write):
+                await loop.run_in_executor(pool, _sync_request, Session, write, seed)
+
+            latencies = await _drive(call, concurrency, seconds, write_ratio)
+            pool.shutdown()
+        elif mode == "threaded":
+            Session = sessionmaker(bind=eng, autoflush=False, expire_on_commit=False)
+
+            async def call(write):
+                await _async_request(lambda: ThreadedSession(Session()), write, seed)
+
+            latencies = await _drive(call, concurrency, seconds, write_ratio)
+        else:
+            aeng = make_async_engine(async_url(url))
+            Session = async_sessionmaker(aeng, autoflush=False, expire_on_commit=False)
+
+            async def call(write):
+                await _async_request(Session, write, seed)
+
+            latencies = await _drive(call, concurrency, seconds, write_ratio)
+            await aeng.dispose()
+        eng.dispose()
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return {"rps": len(latencies) / seconds, "p50": pct(0.50), "p95": pct(0.95)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'req/s':>12}{'p50 ms':>12}{'p95 ms':>12}")
+    for mode in ("sync", "async", "threaded"):
+        r = asyncio.run(run(mode, args.concurrency, args.seconds, args.write_ratio, args.seed))
+        print(f"{mode:<10}{r['rps']:>12.1f}{r['p50']:>12.1f}{r['p95']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Concurrent read/write throughput of the SQLite engine, default journaling
+versus the tuned pragmas from database.make_engine().
+
+    python -m benchmarks.db_throughput [--readers 8] [--writers 2] [--seconds 5]
+
+Each run uses a fresh temporary database seeded with --seed complaints.
+Readers fetch the newest page of complaints; writers submit a complaint
+(ticket sequence + insert) and update another complaint's status.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, make_engine, Complaint, User, generate_ticket_id
+
+CATEGORIES = ["Water Leakage", "Electricity", "Classroom Maintenance", "Internet"]
+BUILDINGS = ["Xavier Block", "Alphonso Block", "Administration Block", "Canteen", "Hostel"]
+
+
+def _seed(Session, n: int):
+    db = Session()
+    db.add(User(name="Bench Student", email="bench@campus.edu", password="x"))
+    db.flush()
+    for i in range(n):
+        db.add(Complaint(
+            ticket_id=f"BENCH-{i:06d}", student_id=1,
+            category=random.choice(CATEGORIES), building=random.choice(BUILDINGS),
+            room_number=str(i % 300), description="Seeded complaint", status="Pending",
+        ))
+    db.commit()
+    db.close()
+
+
+def _reader(Session, stop, counts: Counter):
+    db = Session()
+    while not stop.is_set():
+        try:
+            db.query(Complaint).order_by(Complaint.created_at.desc()).limit(50).all()
+            counts["reads"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+        finally:
+            db.rollback()
+    db.close()
+
+
+def _writer(Session, stop, counts: Counter, seeded: int):
+    db = Session()
+    while not stop.is_set():
+        try:
+            db.add(Complaint(
+                ticket_id=generate_ticket_id(db), student_id=1,
+                category=random.choice(CATEGORIES), building=random.choice(BUILDINGS),
+                room_number="101", description="Benchmark write", status="Pending",
+            ))
+            c = db.get(Complaint, random.randint(1, seeded))
+            c.status = random.choice(["Pending", "In Progress", "Resolved"])
+            db.commit()
+            counts["writes"] += 1
+        except OperationalError:
+            db.rollback()
+            counts["errors"] += 1
+    db.close()
+
+
+def run(tuned: bool, readers: int, writers: int, seconds: float, seed: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        eng = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", tuned=tuned)
+        Base.metadata.create_all(eng)
+        Session = sessionmaker(bind=eng, autoflush=False)
+        _seed(Session, seed)
+
+        # One counter per thread, summed at the end
+        stop = threading.Event()
+        jobs = [(_reader, ()) for _ in range(readers)] + [(_writer, (seed,)) for _ in range(writers)]
+        counters = [Counter() for _ in jobs]
+        threads = [
+            threading.Thread(target=fn, args=(Session, stop, counts, *extra))
+            for (fn, extra), counts in zip(jobs, counters)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        eng.dispose()
+    total = sum(counters, Counter())
+    return {k: total[k] / seconds for k in ("reads", "writes", "errors")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'reads/s':>12}{'writes/s':>12}{'errors/s':>12}")
+    for label, tuned in (("default", False), ("tuned", True)):
+        r = run(tuned, args.readers, args.writers, args.seconds, args.seed)
+        print(f"{label:<10}{r['reads']:>12.1f}{r['writes']:>12.1f}{r['errors']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Seed a synthetic campus for benchmarking.
+
+    python -m benchmarks.seed --db data/bench.db [--students 200] [--complaints 5000]
+
+Creates the schema through the migration runner, then bulk-inserts students,
+complaints across CAMPUS_BUILDINGS and the portal's categories, admin
+comments and notifications, assigned to the staff the migrations create. Output is deterministic for a given --rng-seed.
+Every student logs in as student<N>@campus.edu with BENCH_PASSWORD.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+from database import make_engine, User, Complaint, Comment, Notification, Staff
+from migrations import upgrade
+from search import create_search_index
+from auth import hash_password
+from routes.complaint_routes import CAMPUS_BUILDINGS
+import stats
+import staff
+
+CATEGORIES = ["Water Leakage", "Electricity", "Classroom Maintenance", "Internet", "Other"]
+STATUSES = ["Pending", "In Progress", "Resolved"]
+BENCH_PASSWORD = "bench-pass"
+WORDS = (
+    "leak tap broken light fan socket wifi projector door window ceiling "
+    "water power outage slow noisy desk chair cracked flooding smell"
+).split()
+
+BATCH = 1000
+
+
+def student_email(n: int) -> str:
+    return f"student{n}@campus.edu"
+
+
+def _batched(rows):
+    for i in range(0, len(rows), BATCH):
+        yield rows[i:i + BATCH]
+
+
+def seed_campus(
+    url: str,
+    students: int = 200,
+    complaints: int = 5000,
+    comments: int = 2,
+    notifications: int = 3,
+    days: int = 180,
+    rng_seed: int = 1,
+) -> dict:
+    """Create and fill the database at `url`; returns row counts.
+    `comments` and `notifications` are per complaint on average."""
+    rng = random.Random(rng_seed)
+    eng = make_engine(url)
+    upgrade(eng)
+    create_search_index(eng)
+
+    # Hashing is deliberately slow; every student shares one hash
+    password = hash_password(BENCH_PASSWORD)
+    now = datetime.utcnow()
+    counts = {}
+    with eng.begin() as conn:
+        conn.execute(insert(User), [
+            {"name": f"Student {n}", "email": student_email(n), "student_id": f"S{n:05d}",
+             "password": password, "role": "student", "created_at": now - timedelta(days=days)}
+            for n in range(1, students + 1)
+        ])
+        counts["users"] = students
+        members = conn.execute(select(Staff.id, Staff.name).order_by(Staff.id)).all()
+
+        complaint_rows, comment_rows, notif_rows = [], [], []
+        start = now - timedelta(days=days)
+        for n in range(1, complaints + 1):
+            created = start + timedelta(seconds=days * 86400 * n / (complaints + 1))
+            status = rng.choices(STATUSES, weights=(3, 2, 5))[0]
+            student_id = rng.randint(1, students)
+            text = " ".join(rng.choices(WORDS, k=8))
+            member = rng.choice(members) if status != "Pending" else None
+            complaint_rows.append({
+                "id": n,
+                "ticket_id": f"CF-{created.year}-{n:04d}",
+                "student_id": student_id,
+                "category": rng.choice(CATEGORIES),
+                "building": rng.choice(CAMPUS_BUILDINGS),
+                "room_number": str(rng.randint(1, 400)),
+                "description": text.capitalize() + ".",
+                "status": status,
+                "assigned_to": member.name if member else None,
+                "assigned_staff_id": member.id if member else None,
+                "created_at": created,
+                "updated_at": created + timedelta(hours=rng.randint(0, 72)),
+            })
+            for _ in range(rng.randint(0, 2 * comments)):
+                comment_rows.append({"complaint_id": n, "author": "Admin",
+                                     "text": " ".join(rng.choices(WORDS, k=6)), "created_at": created})
+            for _ in range(rng.randint(0, 2 * notifications)):
+                notif_rows.append({"user_id": student_id, "complaint_id": n, "is_read": rng.random() < 0.7,
+                                   "message": f"Your complaint CF-{created.year}-{n:04d} was updated.",
+                                   "created_at": created})
+
+        for model, rows in ((Complaint, complaint_rows), (Comment, comment_rows), (Notification, notif_rows)):
+            for batch in _batched(rows):
+                conn.execute(insert(model), batch)
+            counts[model.__tablename__] = len(rows)
+
+    db = sessionmaker(bind=eng)()
+    try:
+        stats.rebuild_counters(db)
+        staff.rebuild_counters(db)
+    finally:
+        db.close()
+    eng.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="SQLite file to create (or a database URL)")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--complaints", type=int, default=5000)
+    parser.add_argument("--comments", type=int, default=2, help="average per complaint")
+    parser.add_argument("--notifications", type=int, default=3, help="average per complaint")
+    parser.add_argument("--rng-seed", type=int, default=1)
+    args = parser.parse_args()
+
+    url = args.db if "://" in args.db else f"sqlite:///{args.db}"
+    counts = seed_campus(url, args.students, args.complaints, args.comments, args.notifications,
+                         rng_seed=args.rng_seed)
+    print(", ".join(f"{n} {table}" for table, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Serialization and compression cost of a large complaint list payload.
+
+    python -m benchmarks.serialization [--complaints 10000] [--repeat 5]
+
+Builds the GET /api/complaints payload for --complaints seeded complaints
+(with comments, as the detail view would send them) and times FastAPI's
+default path (jsonable_encoder + JSONResponse) against responses.dumps,
+then reports the body size and encode time with gzip and, if installed,
+brotli.
+"""
+import argparse
+import os
+import tempfile
+import time
+import zlib
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import sessionmaker, selectinload, joinedload
+
+from database import make_engine, Complaint
+from benchmarks.seed import seed_campus
+from compression import brotli, GZIP_LEVEL, BROTLI_QUALITY
+from responses import dumps, orjson
+from routes.complaint_routes import _complaint_to_dict
+
+
+def _best(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--complaints", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        seed_campus(url, students=500, complaints=args.complaints)
+        eng = make_engine(url)
+        db = sessionmaker(bind=eng)()
+        complaints = (
+            db.query(Complaint)
+            .options(joinedload(Complaint.student), selectinload(Complaint.comments))
+            .order_by(Complaint.created_at.desc(), Complaint.id.desc())
+            .all()
+        )
+        db.close()
+        eng.dispose()
+
+    print(f"{len(complaints)} complaints, encoder: {'orjson' if orjson else 'stdlib json'}")
+    for label, summary in (("list (summary)", True), ("with comments", False)):
+        build_ms, payload = _best(lambda: [_complaint_to_dict(c, summary) for c in complaints], args.repeat)
+        default_ms, body = _best(lambda: JSONResponse(jsonable_encoder(payload)).body, args.repeat)
+        fast_ms, fast_body = _best(lambda: dumps(payload), args.repeat)
+        print(f"\n{label}: build dicts {build_ms:.1f} ms")
+        print(f"  {'encoder':<32}{'ms':>10}{'bytes':>12}")
+        print(f"  {'jsonable_encoder + JSONResponse':<32}{default_ms:>10.1f}{len(body):>12}")
+        print(f"  {'responses.dumps':<32}{fast_ms:>10.1f}{len(fast_body):>12}")
+
+        gz_ms, gz = _best(lambda: zlib.compress(fast_body, GZIP_LEVEL, wbits=31), args.repeat)
+        print(f"  {f'gzip -{GZIP_LEVEL}':<32}{gz_ms:>10.1f}{len(gz):>12}")
+        if brotli is not None:
+            br_ms, br = _best(lambda: brotli.compress(fast_body, quality=BROTLI_QUALITY), args.repeat)
+            print(f"  {f'brotli q{BROTLI_QUALITY}':<32}{br_ms:>10.1f}{len(br):>12}")
+
+
+if __name__ == "__main__":
+    main()
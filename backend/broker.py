@@ -0,0 +1,239 @@
+"""
+In-process pub/sub for pushing notifications to connected clients.
+Routes queue events on the session; they are published only once the
+transaction commits. Each event id is "<epoch>-<seq>" so clients
+reconnecting with Last-Event-ID can be replayed from a short per-user
+history, or told to resync when that is impossible (history evicted or
+the broker restarted).
+With SHARED_STATE=sqlite, SharedBroker fans events out across worker
+processes through an events table in the shared state file.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from sqlalchemy import event, MetaData, Table, Column, Integer, String, Text, Float, select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import make_engine
+from shared_state import SHARED_STATE, SHARED_STATE_PATH, file_lock
+
+HISTORY_PER_USER = 100
+BROKER_POLL_SECONDS = float(os.getenv("BROKER_POLL_SECONDS", "0.25"))
+BROKER_HISTORY_SECONDS = float(os.getenv("BROKER_HISTORY_SECONDS", "3600"))
+
+log = logging.getLogger("scms.broker")
+
+
+@dataclass
+class Event:
+    seq: int
+    id: str
+    data: dict
+
+
+class Broker:
+    """Interface for notification fan-out backends."""
+
+    def publish(self, user_id: int, data: dict):
+        raise NotImplementedError
+
+    def subscribe(self, user_id: int):
+        """Context manager yielding an asyncio.Queue of Events for user_id."""
+        raise NotImplementedError
+
+    def replay(self, user_id: int, last_event_id: str) -> list[Event] | None:
+        """Events after last_event_id, or None if the client must resync."""
+        raise NotImplementedError
+
+    def start(self):
+        """Begin background delivery, if the backend needs it."""
+
+    def stop(self):
+        pass
+
+
+class InMemoryBroker(Broker):
+    def __init__(self, history: int = HISTORY_PER_USER):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._history: dict[int, deque] = defaultdict(lambda: deque(maxlen=history))
+        self._evicted_upto: dict[int, int] = {}
+        self._subscribers: dict[int, set] = defaultdict(set)
+
+    def publish(self, user_id: int, data: dict):
+        with self._lock:
+            seq = next(self._seq)
+            evt = Event(seq, f"{self.epoch}-{seq}", data)
+            history = self._history[user_id]
+            if len(history) == history.maxlen:
+                self._evicted_upto[user_id] = history[0].seq
+            history.append(evt)
+        self._fanout(user_id, evt)
+
+    def _fanout(self, user_id: int, evt: Event):
+        """Hand evt to this process's subscribers for user_id."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, evt)
+
+    @contextmanager
+    def subscribe(self, user_id: int):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[user_id].add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(entry)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+    def replay(self, user_id: int, last_event_id: str) -> list[Event] | None:
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        last_seq = int(seq)
+        with self._lock:
+            if last_seq < self._evicted_upto.get(user_id, 0):
+                return None
+            return [e for e in self._history.get(user_id, ()) if e.seq > last_seq]
+
+    def connected(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+class SharedBroker(InMemoryBroker):
+    """Publishes into a table every worker tails, so a student connected to any
+    worker receives events committed by any other. Event ids are table ids."""
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        super().__init__()
+        self.engine = make_engine(f"sqlite:///{path}")
+        metadata = MetaData()
+        self.events = Table(
+            "broker_events", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("user_id", Integer, nullable=False, index=True),
+            Column("data", Text, nullable=False),
+            Column("created_at", Float, nullable=False, index=True),
+            sqlite_autoincrement=True,    # ids are never reused after pruning
+        )
+        self.meta = Table(
+            "broker_meta", metadata,
+            Column("name", String(50), primary_key=True),
+            Column("value", String(50), nullable=False),
+        )
+        with file_lock(path + ".lock"):
+            metadata.create_all(self.engine)
+            with self.engine.begin() as conn:
+                conn.execute(sqlite_insert(self.meta).values(name="epoch", value=self.epoch).on_conflict_do_nothing())
+                conn.execute(sqlite_insert(self.meta).values(name="pruned_upto", value="0").on_conflict_do_nothing())
+        with self.engine.connect() as conn:
+            # All workers share one epoch, so any of them can replay a client's Last-Event-ID
+            self.epoch = conn.scalar(select(self.meta.c.value).where(self.meta.c.name == "epoch"))
+            self._last_id = conn.scalar(select(func.coalesce(func.max(self.events.c.id), 0)))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self, user_id: int, data: dict):
+        with self.engine.begin() as conn:
+            conn.execute(self.events.insert().values(user_id=user_id, data=json.dumps(data), created_at=time.time()))
+
+    def replay(self, user_id: int, last_event_id: str) -> list[Event] | None:
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        last_seq = int(seq)
+        with self.engine.connect() as conn:
+            pruned_upto = int(conn.scalar(select(self.meta.c.value).where(self.meta.c.name == "pruned_upto")))
+            if last_seq < pruned_upto:
+                return None
+            rows = conn.execute(
+                select(self.events.c.id, self.events.c.data)
+                .where(self.events.c.user_id == user_id, self.events.c.id > last_seq)
+                .order_by(self.events.c.id)
+            ).all()
+        return [Event(r.id, f"{self.epoch}-{r.id}", json.loads(r.data)) for r in rows]
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._tail, name="broker-tail", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _tail(self):
+        next_prune = 0.0
+        while not self._stop.wait(BROKER_POLL_SECONDS):
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(
+                        select(self.events).where(self.events.c.id > self._last_id).order_by(self.events.c.id)
+                    ).all()
+                for r in rows:
+                    self._last_id = r.id
+                    self._fanout(r.user_id, Event(r.id, f"{self.epoch}-{r.id}", json.loads(r.data)))
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + 60
+                    self._prune()
+            except Exception:
+                log.exception("broker tail error")
+
+    def _prune(self):
+        cutoff = time.time() - BROKER_HISTORY_SECONDS
+        with self.engine.begin() as conn:
+            upto = conn.scalar(select(func.max(self.events.c.id)).where(self.events.c.created_at < cutoff))
+            if upto:
+                conn.execute(delete(self.events).where(self.events.c.id <= upto))
+                conn.execute(self.meta.update().where(self.meta.c.name == "pruned_upto").values(value=str(upto)))
+
+
+_broker: Broker | None = None
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        _broker = SharedBroker() if SHARED_STATE == "sqlite" else InMemoryBroker()
+    return _broker
+
+
+def set_broker(broker: Broker):
+    global _broker
+    _broker = broker
+
+
+# ── Publish on commit ───────────────────────────────────
+def queue_event(db, user_id: int, data: dict):
+    """Publish `data` to user_id once the session's transaction commits."""
+    db.info.setdefault("pending_events", []).append((user_id, data))
+
+
+# Registered on Session itself so sync and async sessions both publish
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    for user_id, data in session.info.pop("pending_events", []):
+        get_broker().publish(user_id, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop("pending_events", None)
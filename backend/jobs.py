@@ -0,0 +1,234 @@
+"""
+Persistent background jobs.
+Handlers enqueue work into the jobs table inside their own transaction, so
+a job exists exactly when the change that caused it commits. Worker threads
+claim due jobs with a lease, run the registered handler in a fresh session
+and mark the job done in the same transaction as the handler's writes.
+Failures are retried with exponential backoff until max_attempts; a worker
+that dies mid-job loses its lease and the job is picked up again, unless it
+has used up its attempts, in which case the scheduler marks it failed.
+Handlers that run longer than JOB_LEASE_SECONDS call renew_lease() between
+batches.
+Periodic jobs are enqueued by a scheduler thread once per interval, keyed
+by the interval number so each period runs once.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, update, delete, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Job
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "2"))    # doubled per attempt
+JOB_BACKOFF_MAX = 600
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+log = logging.getLogger("scms.jobs")
+
+HANDLERS: dict = {}
+PERIODIC: dict = {}      # kind -> interval seconds
+SCHEDULER_TICK = 60      # seconds
+_wake = threading.Event()
+_stop = threading.Event()
+_threads: list[threading.Thread] = []
+_current = threading.local()   # the job this worker thread is running
+
+
+def handler(kind: str):
+    """Register fn(db, payload) to run jobs of this kind."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def periodic(kind: str, seconds: float):
+    """Run jobs of this kind every `seconds` while workers are running."""
+    PERIODIC[kind] = seconds
+
+
+# ── Enqueue ─────────────────────────────────────────────
+def enqueue(db: Session, kind: str, payload: dict, key: str | None = None,
+            delay: float = 0, max_attempts: int = 5):
+    """Queue a job in the caller's transaction. Call through run_sync from async handlers."""
+    values = dict(
+        kind=kind, payload=payload, idempotency_key=key, status="queued", attempts=0,
+        max_attempts=max_attempts, run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    dialect = db.get_bind().dialect.name
+    if key is not None and dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        db.execute(insert(Job).values(**values).on_conflict_do_nothing(index_elements=["idempotency_key"]))
+    elif key is None or db.scalar(select(Job.id).where(Job.idempotency_key == key)) is None:
+        db.add(Job(**values))
+    db.info["jobs_enqueued"] = True
+
+
+# Wake idle workers as soon as new jobs are committed
+@event.listens_for(Session, "after_commit")
+def _wake_workers(session):
+    if session.info.pop("jobs_enqueued", False):
+        _wake.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_enqueued(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+# ── Workers ─────────────────────────────────────────────
+def _claim(db: Session):
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        # Lease expired: the worker died, so the attempt counts
+        and_(Job.status == "running", Job.locked_until < now, Job.attempts < Job.max_attempts),
+    )
+    next_id = select(Job.id).where(claimable).order_by(Job.run_at).limit(1).scalar_subquery()
+    row = db.execute(
+        update(Job)
+        .where(Job.id == next_id, claimable)
+        .values(status="running", attempts=Job.attempts + 1,
+                locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS))
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return row
+
+
+def run_next() -> bool:
+    """Run one due job. Returns False when none is due."""
+    db = SessionLocal()
+    try:
+        job = _claim(db)
+        if job is None:
+            return False
+        try:
+            fn = HANDLERS.get(job.kind)
+            if fn is None:
+                raise LookupError(f"no handler for job kind {job.kind!r}")
+            _current.job_id = job.id
+            try:
+                fn(db, job.payload)
+            finally:
+                _current.job_id = None
+            db.execute(update(Job).where(Job.id == job.id).values(
+                status="done", locked_until=None, last_error=None))
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            failed = job.attempts >= job.max_attempts
+            backoff = min(JOB_BACKOFF_SECONDS * 2 ** (job.attempts - 1), JOB_BACKOFF_MAX)
+            db.execute(update(Job).where(Job.id == job.id).values(
+                status="failed" if failed else "queued", locked_until=None,
+                run_at=datetime.utcnow() + timedelta(seconds=backoff), last_error=repr(exc)[:2000]))
+            db.commit()
+            log.warning("job %s (%s) attempt %s failed: %r", job.id, job.kind, job.attempts, exc)
+        return True
+    finally:
+        db.close()
+
+
+def renew_lease(db: Session):
+    """Extend the running job's lease, in the caller's transaction. Handlers that work in
+    batches call this before each commit so no other worker starts the job meanwhile;
+    outside a job it does nothing."""
+    job_id = getattr(_current, "job_id", None)
+    if job_id is not None:
+        db.execute(
+            update(Job).where(Job.id == job_id)
+            .values(locked_until=datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def fail_abandoned(db: Session) -> int:
+    """Mark failed the jobs whose worker died during their last attempt."""
+    result = db.execute(
+        update(Job)
+        .where(Job.status == "running", Job.locked_until < datetime.utcnow(), Job.attempts >= Job.max_attempts)
+        .values(status="failed", locked_until=None, last_error="worker stopped during the last attempt")
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def prune(days: float = JOB_RETENTION_DAYS) -> int:
+    """Delete finished jobs older than `days`; returns how many were removed."""
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        result = db.execute(delete(Job).where(Job.status == "done", Job.updated_at < cutoff))
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+@handler("prune-jobs")
+def _prune_job(db, payload: dict):
+    prune()
+
+
+periodic("prune-jobs", 86400)
+
+
+def _work():
+    while not _stop.is_set():
+        try:
+            if run_next():
+                continue
+        except Exception:
+            log.exception("job worker error")
+        _wake.wait(JOB_POLL_SECONDS)
+        _wake.clear()
+
+
+def _schedule():
+    while True:
+        db = SessionLocal()
+        try:
+            fail_abandoned(db)
+            now = time.time()
+            for kind, seconds in PERIODIC.items():
+                enqueue(db, kind, {}, key=f"{kind}:{int(now // seconds)}", max_attempts=1)
+            db.commit()
+        except Exception:
+            log.exception("job scheduler error")
+        finally:
+            db.close()
+        if _stop.wait(SCHEDULER_TICK):
+            return
+
+
+def start_workers(count: int = JOB_WORKERS):
+    _stop.clear()
+    for target, name in [(_work, f"job-worker-{i}") for i in range(count)] + [(_schedule, "job-scheduler")]:
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        _threads.append(t)
+
+
+def stop_workers(timeout: float = 5):
+    _stop.set()
+    _wake.set()
+    for t in _threads:
+        t.join(timeout)
+    _threads.clear()
+
+
+def drain(timeout: float = 10) -> bool:
+    """Run due jobs in the calling thread until none are left (tests, maintenance)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not run_next():
+            return True
+    return False
@@ -2,15 +2,40 @@ import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse
 
-from database import create_tables
+from migrations import upgrade
+from auth import shutdown_hash_pool
+import jobs
+import retention   # registers the periodic notification retention job
+import archival    # registers the periodic complaint archival job
+from search import create_search_index
+from shared_state import file_lock, INIT_LOCK_PATH
+from broker import get_broker
+import metrics
+from admission import RateLimitMiddleware, ConcurrencyLimitMiddleware
+from compression import CompressionMiddleware
+from responses import FastJSONResponse
+from stats import init_counters
+from storage import UPLOAD_DIR, UploadStaticFiles, UploadLimitMiddleware
 from routes.auth_routes import router as auth_router
 from routes.complaint_routes import router as complaint_router
 from routes.admin_routes import router as admin_router
 from routes.notification_routes import router as notification_router
 
-app = FastAPI(title="Student Complaint Management System", version="2.0.0")
+app = FastAPI(
+    title="Student Complaint Management System",
+    version="2.0.0",
+    default_response_class=FastJSONResponse,
+)
+
+# Oversized uploads are cut off while they arrive, before any of the body is spooled
+app.add_middleware(UploadLimitMiddleware)
+
+# Inside CORS, so CORS answers preflights first and adds its headers to 429/503s.
+# Rate-limited requests are rejected before they can take a concurrency slot.
+app.add_middleware(ConcurrencyLimitMiddleware)
+app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,17 +43,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
-# Initialize database tables on startup
+# gzip/brotli for responses over COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so latency includes compression, CORS and routing
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Bring the database schema up to date on startup. Workers of a multi-process
+# server start together: the first migrates, the others find nothing to do.
 @app.on_event("startup")
 def on_startup():
-    create_tables()
+    with file_lock(INIT_LOCK_PATH):
+        upgrade()
+        create_search_index()
+        init_counters()
+    get_broker().start()
+    jobs.start_workers()
 
-# Serve uploaded images
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+
+@app.on_event("shutdown")
+def on_shutdown():
+    jobs.stop_workers()
+    get_broker().stop()
+    shutdown_hash_pool()
+
+# Serve uploaded images (content-addressed, cached as immutable)
+app.mount("/uploads", UploadStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Register API routers
 app.include_router(auth_router)
@@ -44,3 +87,9 @@ app.mount("/app", StaticFiles(directory=FRONTEND_DIR, html=True), name="frontend
 @app.get("/")
 def root():
     return RedirectResponse(url="/app/index.html")
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
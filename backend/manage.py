@@ -0,0 +1,207 @@
+"""
+Maintenance commands.
+Usage: python manage.py <command> [options]
+"""
+import argparse
+import os
+from datetime import datetime
+from sqlalchemy import text, func, select, update
+
+from database import SessionLocal, engine, Complaint, ComplaintArchive, Comment, Job
+
+
+def cmd_gc_uploads(args):
+    from storage import collect_garbage
+    db = SessionLocal()
+    try:
+        removed = collect_garbage(db, grace_seconds=int(args.grace_hours * 3600), dry_run=args.dry_run)
+    finally:
+        db.close()
+    for path in removed:
+        print(("would remove " if args.dry_run else "removed ") + path)
+    print(f"{len(removed)} orphaned file(s)")
+
+
+def cmd_migrate(args):
+    from migrations import MIGRATIONS, applied_versions, upgrade
+    if args.status:
+        done = applied_versions()
+        for version, _ in MIGRATIONS:
+            print(f"[{'x' if version in done else ' '}] {version}")
+        return
+    ran = upgrade()
+    print("\n".join(f"applied {v}" for v in ran) or "schema is up to date")
+
+
+def cmd_jobs(args):
+    import jobs
+    if args.prune is not None:
+        print(f"pruned {jobs.prune(args.prune)} finished job(s)")
+    db = SessionLocal()
+    try:
+        if args.retry_failed:
+            n = db.execute(update(Job).where(Job.status == "failed").values(status="queued", attempts=0)).rowcount
+            db.commit()
+            print(f"requeued {n} failed job(s)")
+        rows = db.query(Job.kind, Job.status, func.count(Job.id)).group_by(Job.kind, Job.status).all()
+    finally:
+        db.close()
+    for kind, status, n in sorted(rows):
+        print(f"{kind:<26}{status:<10}{n:>8}")
+
+
+def cmd_prune_notifications(args):
+    import retention
+    days = retention.NOTIFY_RETENTION_DAYS if args.days is None else args.days
+    mode = args.mode or retention.NOTIFY_RETENTION_MODE
+    db = SessionLocal()
+    try:
+        n = retention.reclaim(db, days=days, mode=mode)
+    finally:
+        db.close()
+    print(f"{'archived' if mode == 'archive' else 'purged'} {n} read notification(s)")
+
+
+def cmd_archive_complaints(args):
+    import archival
+    days = archival.COMPLAINT_ARCHIVE_DAYS if args.days is None else args.days
+    batch = args.batch or archival.COMPLAINT_ARCHIVE_BATCH
+    db = SessionLocal()
+    try:
+        before = archival.table_sizes(db)
+        n = archival.archive(db, days=days, batch=batch)
+        after = archival.table_sizes(db)
+    finally:
+        db.close()
+    print(f"archived {n} resolved complaint(s)")
+    print(f"{'table':<24}{'rows before':>12}{'rows after':>12}{'bytes before':>14}{'bytes after':>14}")
+    for table in before:
+        b, a = before[table], after[table]
+        print(f"{table:<24}{b['rows']:>12}{a['rows']:>12}{b.get('bytes', '-'):>14}{a.get('bytes', '-'):>14}")
+
+
+def _hot_queries() -> dict:
+    """The statements behind the list, detail and notification endpoints and the
+    notification job, built by the route helpers that issue them."""
+    from routes import complaint_routes as cr, notification_routes as nr
+    admin, student = {"role": "admin", "id": 1}, {"role": "student", "id": 1}
+    since = datetime(2000, 1, 1)
+    page = 51   # a limit=50 page fetches one extra row to tell whether there is more
+
+    def listed(user, status=None, category=None, search=None, since=None, model=Complaint):
+        return cr._filtered_complaints(user, category, status, search, since, model=model)
+
+    lists = {
+        "student complaints": listed(student),
+        "admin complaints": listed(admin),
+        "complaints by status": listed(admin, status="Pending"),
+        "complaints by category": listed(admin, category="Internet"),
+        "complaints since": listed(admin, since=since),
+        "complaint search": listed(admin, search="water"),
+        "archived student complaints": listed(student, model=ComplaintArchive),
+        "complaints archived since": listed(admin, since=since, model=ComplaintArchive),
+    }
+    queries = {}
+    for name, q in lists.items():
+        model = q.column_descriptions[0]["entity"]
+        queries[f"{name} (version)"] = cr._version_query(q)
+        queries[f"{name} (page)"] = cr._page_query(q, page)
+        queries[f"{name} (next page)"] = cr._page_query(cr._after_cursor(q, model, since, 1000), page)
+    queries["search ranked"] = cr._page_query(cr._filtered_complaints(admin, None, None, "water", ranked=True))
+    queries["complaint head"] = cr._head_query(1)
+    queries["complaint detail"] = cr._complaint_query(1)
+    # What the detail's selectin loader emits for Complaint.comments
+    queries["complaint comments"] = select(Comment).where(Comment.complaint_id.in_([1]))
+
+    mine = nr._user_notifications(1)
+    queries["notifications (version)"] = nr._version_query(mine)
+    queries["notifications (page)"] = nr._page_query(mine)
+    queries["notifications since (version)"] = nr._version_query(nr._user_notifications(1, since))
+    queries["notifications archived since"] = nr._archived_since_query(1, since)
+    queries["notifications mark read"] = nr._mark_all_read_query(1)
+    queries["notifications to coalesce"] = nr._unread_matching({(1, 1, "status"), (2, 1, "comment")})
+    return queries
+
+
+def query_plans(db) -> list[tuple[str, list[str], bool]]:
+    """(name, EXPLAIN QUERY PLAN lines, scans a table) for each hot query."""
+    results = []
+    for name, stmt in _hot_queries().items():
+        sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+        plan = [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        full_scan = any(p.startswith("SCAN") and "INDEX" not in p for p in plan)
+        results.append((name, plan, full_scan))
+    return results
+
+
+def cmd_explain(args):
+    """Print EXPLAIN QUERY PLAN for the hot queries; exit 1 if any scans a table."""
+    if engine.dialect.name != "sqlite":
+        raise SystemExit("explain only supports SQLite")
+    from search import create_search_index
+    create_search_index()   # as on startup, so search plans use the FTS index
+    db = SessionLocal()
+    try:
+        results = query_plans(db)
+    finally:
+        db.close()
+    for name, plan, full_scan in results:
+        print(f"{'SCAN' if full_scan else 'ok  '}  {name}: {'; '.join(plan)}")
+    if any(full_scan for _, _, full_scan in results):
+        raise SystemExit(1)
+
+
+def cmd_serve(args):
+    """Run the API with uvicorn, optionally across several worker processes."""
+    import uvicorn
+    if args.workers > 1 and os.getenv("SHARED_STATE", "local") == "local":
+        # In-process caches and fan-out would diverge between workers
+        os.environ["SHARED_STATE"] = "sqlite"
+        print("SHARED_STATE=sqlite (required with more than one worker)")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, proxy_headers=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SCMS maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gc = sub.add_parser("gc-uploads", help="delete uploaded images no complaint references")
+    gc.add_argument("--grace-hours", type=float, default=24, help="keep files newer than this (default 24)")
+    gc.add_argument("--dry-run", action="store_true", help="list files without deleting them")
+    gc.set_defaults(func=cmd_gc_uploads)
+
+    mig = sub.add_parser("migrate", help="apply pending schema migrations")
+    mig.add_argument("--status", action="store_true", help="list migrations and whether they are applied")
+    mig.set_defaults(func=cmd_migrate)
+
+    jb = sub.add_parser("jobs", help="show background job counts by kind and status")
+    jb.add_argument("--retry-failed", action="store_true", help="requeue jobs that used up their attempts")
+    jb.add_argument("--prune", type=float, metavar="DAYS", help="delete finished jobs older than DAYS")
+    jb.set_defaults(func=cmd_jobs)
+
+    pn = sub.add_parser("prune-notifications", help="archive or purge old read notifications now")
+    pn.add_argument("--days", type=float, default=None, help="age in days (default NOTIFY_RETENTION_DAYS)")
+    pn.add_argument("--mode", choices=("archive", "purge"), default=None,
+                    help="default NOTIFY_RETENTION_MODE")
+    pn.set_defaults(func=cmd_prune_notifications)
+
+    ar = sub.add_parser("archive-complaints", help="move old resolved complaints to the archive tables now")
+    ar.add_argument("--days", type=float, default=None, help="resolved for this long (default COMPLAINT_ARCHIVE_DAYS)")
+    ar.add_argument("--batch", type=int, default=None, help="complaints per transaction (default COMPLAINT_ARCHIVE_BATCH)")
+    ar.set_defaults(func=cmd_archive_complaints)
+
+    srv = sub.add_parser("serve", help="run the API server (use --workers to use every core)")
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8000)
+    srv.add_argument("--workers", type=int, default=1, help=f"worker processes (this machine has {os.cpu_count()} cores)")
+    srv.set_defaults(func=cmd_serve)
+
+    exp = sub.add_parser("explain", help="check that hot endpoint queries use an index")
+    exp.set_defaults(func=cmd_explain)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
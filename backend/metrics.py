@@ -0,0 +1,213 @@
+"""
+Request and query instrumentation.
+MetricsMiddleware records per-route latency histograms, response sizes and
+in-flight requests; engine listeners count each request's SQL statements
+and database time. Everything is exposed in Prometheus text format by
+render() (served on /metrics) and per response as a Server-Timing header.
+Statements slower than SLOW_QUERY_MS are logged to the "scms.sql" logger.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import event
+
+from database import engine, async_engine
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+log = logging.getLogger("scms.sql")
+
+
+# ── Registry ────────────────────────────────────────────
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Process-local metrics, keyed by (method, route) labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = defaultdict(int)                 # (method, route, status)
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self.queries = defaultdict(int)
+        self.db_seconds = defaultdict(float)
+        self.slow_queries = 0
+        self.counters = defaultdict(float)     # (name, ((label, value), ...))
+        self.help: dict[str, str] = {}
+
+    def record(self, method: str, route: str, status: int, seconds: float, size: int, stats: "RequestStats"):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self.latency[key].observe(seconds)
+            self.size[key].observe(size)
+            self.queries[key] += stats.queries
+            self.db_seconds[key] += stats.db_seconds
+
+    def inc(self, name: str, help: str, value: float = 1, **labels):
+        """Add to a counter reported by subsystems outside the request path."""
+        with self._lock:
+            self.help[name] = help
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def render(self) -> str:
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, series):
+            for (method, route), h in sorted(series.items()):
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+        with self._lock:
+            header("scms_http_requests_in_flight", "gauge", "Requests currently being served.")
+            lines.append(f"scms_http_requests_in_flight {self.in_flight}")
+            header("scms_http_requests_total", "counter", "Requests served, by route and status.")
+            for (method, route, status), n in sorted(self.requests.items()):
+                lines.append(f'scms_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+            header("scms_http_request_duration_seconds", "histogram", "Request latency.")
+            histogram("scms_http_request_duration_seconds", self.latency)
+            header("scms_http_response_size_bytes", "histogram", "Response body size.")
+            histogram("scms_http_response_size_bytes", self.size)
+            header("scms_db_queries_total", "counter", "SQL statements executed while serving requests.")
+            for (method, route), n in sorted(self.queries.items()):
+                lines.append(f'scms_db_queries_total{{method="{method}",route="{route}"}} {n}')
+            header("scms_db_query_seconds_total", "counter", "Time spent in SQL statements while serving requests.")
+            for (method, route), s in sorted(self.db_seconds.items()):
+                lines.append(f'scms_db_query_seconds_total{{method="{method}",route="{route}"}} {s}')
+            header("scms_db_slow_queries_total", "counter", f"SQL statements slower than {SLOW_QUERY_MS:g} ms.")
+            lines.append(f"scms_db_slow_queries_total {self.slow_queries}")
+            for name in sorted(self.help):
+                header(name, "counter", self.help[name])
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        text = ",".join(f'{k}="{v}"' for k, v in labels)
+                        lines.append(f"{name}{{{text}}} {value:g}" if text else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ── Per-request database time ───────────────────────────
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_stats", default=None)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        with registry._lock:
+            registry.slow_queries += 1
+        log.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+
+for _eng in (engine, async_engine.sync_engine) if async_engine else (engine,):
+    event.listen(_eng, "before_cursor_execute", _before_execute)
+    event.listen(_eng, "after_cursor_execute", _after_execute)
+
+
+# ── Middleware ──────────────────────────────────────────
+def _route_label(scope) -> str:
+    """The matched route template, so ids do not explode label cardinality."""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "other")
+    path = scope.get("path", "")
+    for prefix in ("/uploads", "/app"):
+        if path.startswith(prefix):
+            return prefix
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI so streamed responses (SSE) pass through unbuffered."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def instrumented_send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    app_ms = (time.perf_counter() - start) * 1000
+                    timing = (
+                        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                        f"app;dur={app_ms:.1f}"
+                    )
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        with registry._lock:
+            registry.in_flight += 1
+        try:
+            await self.app(scope, receive, instrumented_send)
+        finally:
+            with registry._lock:
+                registry.in_flight -= 1
+            _current.reset(token)
+            registry.record(scope["method"], _route_label(scope), status,
+                            time.perf_counter() - start, size, stats)
+
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,321 @@
+"""
+Schema migrations.
+Each migration runs once, in order, inside its own transaction and is
+recorded in the schema_migrations table. Add new migrations to the end of
+MIGRATIONS; never edit one that has shipped. Migrations must also be safe
+on databases created before this module existed (tables made by the old
+create_all() at startup), so they create objects with checkfirst.
+Every migration declares the tables, columns and indexes it creates as
+they were when it shipped, never through the current models in
+database.py, so a fresh database is built in the same steps as an old one.
+"""
+from datetime import datetime
+from sqlalchemy import (
+    Table, Column, Integer, String, Text, Boolean, Date, DateTime, JSON, ForeignKey, Index,
+    MetaData, inspect, select, insert, update, func, table, column,
+)
+from sqlalchemy.schema import CreateColumn
+
+from database import engine
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", String(80), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _create_tables(conn, *tables: Table):
+    for t in tables:
+        t.create(conn, checkfirst=True)
+
+
+def _create_indexes(conn, table_name: str, *indexes: tuple[str, ...]):
+    """Create each (name, *columns) index on table_name unless it exists."""
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+    target = Table(table_name, MetaData(), autoload_with=conn)
+    for name, *columns in indexes:
+        if name not in existing:
+            Index(name, *(target.c[c] for c in columns)).create(conn)
+
+
+def _add_columns(conn, table_name: str, *columns: Column):
+    existing = {c["name"] for c in inspect(conn).get_columns(table_name)}
+    Table(table_name, MetaData(), *columns)   # CreateColumn needs the columns bound to a table
+    for col in columns:
+        if col.name in existing:
+            continue
+        ddl = str(CreateColumn(col).compile(conn))
+        for fk in col.foreign_keys:
+            ddl += f" REFERENCES {fk.target_fullname.replace('.', ' (')})"
+        conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {ddl}")
+
+
+# ── Migrations ──────────────────────────────────────────
+_0001 = MetaData()
+Table(
+    "users", _0001,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(120), nullable=False),
+    Column("email", String(255), unique=True, index=True, nullable=False),
+    Column("student_id", String(50), nullable=True),
+    Column("password", String(255), nullable=False),
+    Column("role", String(20)),
+    Column("created_at", DateTime),
+)
+Table(
+    "complaints", _0001,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("ticket_id", String(20), unique=True, index=True, nullable=False),
+    Column("student_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("category", String(80), nullable=False),
+    Column("building", String(120), nullable=False),
+    Column("room_number", String(80), nullable=False),
+    Column("description", Text, nullable=False),
+    Column("image_url", String(512), nullable=True),
+    Column("status", String(30)),
+    Column("assigned_to", String(120), nullable=True),
+    Column("admin_comment", Text, nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+Table(
+    "comments", _0001,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("complaint_id", Integer, ForeignKey("complaints.id"), nullable=False),
+    Column("author", String(120), nullable=False),
+    Column("text", Text, nullable=False),
+    Column("created_at", DateTime),
+)
+Table(
+    "notifications", _0001,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("complaint_id", Integer, ForeignKey("complaints.id"), nullable=True),
+    Column("message", String(512), nullable=False),
+    Column("is_read", Boolean),
+    Column("created_at", DateTime),
+)
+Table(
+    "ticket_sequences", _0001,
+    Column("year", Integer, primary_key=True),
+    Column("last_value", Integer, nullable=False),
+)
+Table(
+    "complaint_counters", _0001,
+    Column("day", Date, primary_key=True),
+    Column("status", String(30), primary_key=True),
+    Column("category", String(80), primary_key=True),
+    Column("building", String(120), primary_key=True),
+    Column("count", Integer, nullable=False),
+)
+
+
+def _0001_initial(conn):
+    _create_tables(conn, *_0001.sorted_tables)
+
+
+def _0002_hot_path_indexes(conn):
+    _create_indexes(
+        conn, "complaints",
+        ("ix_complaints_student_created", "student_id", "created_at"),
+        ("ix_complaints_status_created", "status", "created_at"),
+        ("ix_complaints_category_created", "category", "created_at"),
+        ("ix_complaints_created_id", "created_at", "id"),
+        ("ix_complaints_updated", "updated_at"),
+    )
+    _create_indexes(conn, "comments", ("ix_comments_complaint", "complaint_id"))
+    _create_indexes(
+        conn, "notifications",
+        ("ix_notifications_user_created", "user_id", "created_at"),
+        ("ix_notifications_user_unread", "user_id", "is_read"),
+    )
+
+
+_0003 = MetaData()
+Table(
+    "jobs", _0003,
+    Column("id", Integer, primary_key=True),
+    Column("kind", String(50), nullable=False),
+    Column("payload", JSON, nullable=False),
+    Column("idempotency_key", String(200), unique=True, nullable=True),
+    Column("status", String(20), nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("max_attempts", Integer, nullable=False),
+    Column("run_at", DateTime, nullable=False),
+    Column("locked_until", DateTime, nullable=True),
+    Column("last_error", Text, nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Index("ix_jobs_status_run_at", "status", "run_at"),
+)
+
+
+def _0003_jobs(conn):
+    _create_tables(conn, *_0003.sorted_tables)
+
+
+_0004 = MetaData()
+Table(
+    "notifications_archive", _0004,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, nullable=False, index=True),
+    Column("complaint_id", Integer, nullable=True),
+    Column("message", String(512), nullable=False),
+    Column("is_read", Boolean),
+    Column("created_at", DateTime),
+    Column("archived_at", DateTime),
+)
+
+
+def _0004_notification_retention(conn):
+    _create_tables(conn, *_0004.sorted_tables)
+    _add_columns(conn, "users", Column("unread_notifications", Integer, nullable=False, server_default="0"))
+    users = table("users", column("id"), column("unread_notifications"))
+    notifications = table("notifications", column("id"), column("user_id"), column("is_read"))
+    unread = (
+        select(func.count(notifications.c.id))
+        .where(notifications.c.user_id == users.c.id, notifications.c.is_read == False)
+        .scalar_subquery()
+    )
+    conn.execute(update(users).values(unread_notifications=unread))
+
+
+# The staff list that was hardcoded before the staff table existed
+_0005_DEFAULT_STAFF = ["John Smith", "Maria Garcia", "David Lee", "Sarah Wilson", "James Brown"]
+
+_0005 = MetaData()
+_0005_staff_table = Table(
+    "staff", _0005,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(120), unique=True, nullable=False),
+    Column("email", String(255), nullable=True),
+    Column("categories", JSON, nullable=False),
+    Column("buildings", JSON, nullable=False),
+    Column("active", Boolean, nullable=False),
+    Column("open_tickets", Integer, nullable=False, server_default="0"),
+    Column("created_at", DateTime),
+)
+
+
+def _0005_staff(conn):
+    _create_tables(conn, *_0005.sorted_tables)
+    _add_columns(conn, "complaints", Column("assigned_staff_id", Integer, ForeignKey("staff.id"), nullable=True))
+    _create_indexes(conn, "complaints", ("ix_complaints_staff_status", "assigned_staff_id", "status"))
+
+    staff = _0005_staff_table
+    complaints = table("complaints", column("id"), column("assigned_to"), column("assigned_staff_id"), column("status"))
+    # Every free-text assignee becomes a staff member, then complaints point at them
+    names = set(_0005_DEFAULT_STAFF) | set(conn.scalars(
+        select(complaints.c.assigned_to)
+        .where(complaints.c.assigned_to.is_not(None), complaints.c.assigned_to != "").distinct()
+    ))
+    known = set(conn.scalars(select(staff.c.name)))
+    new = sorted(names - known)
+    if new:
+        conn.execute(insert(staff), [
+            {"name": n, "categories": [], "buildings": [], "active": True, "created_at": datetime.utcnow()}
+            for n in new
+        ])
+    staff_id = select(staff.c.id).where(staff.c.name == complaints.c.assigned_to).scalar_subquery()
+    conn.execute(
+        update(complaints).where(complaints.c.assigned_to.is_not(None)).values(assigned_staff_id=staff_id)
+    )
+    open_count = (
+        select(func.count(complaints.c.id))
+        .where(complaints.c.assigned_staff_id == staff.c.id, complaints.c.status != "Resolved")
+        .scalar_subquery()
+    )
+    conn.execute(update(staff).values(open_tickets=open_count))
+
+
+_0006 = MetaData()
+Table(
+    "complaints_archive", _0006,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("ticket_id", String(20), unique=True, index=True, nullable=False),
+    Column("student_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("category", String(80), nullable=False),
+    Column("building", String(120), nullable=False),
+    Column("room_number", String(80), nullable=False),
+    Column("description", Text, nullable=False),
+    Column("image_url", String(512), nullable=True),
+    Column("status", String(30)),
+    Column("assigned_to", String(120), nullable=True),
+    Column("assigned_staff_id", Integer, nullable=True),
+    Column("admin_comment", Text, nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Column("archived_at", DateTime),
+    Index("ix_complaints_archive_student_created", "student_id", "created_at"),
+    Index("ix_complaints_archive_created_id", "created_at", "id"),
+)
+Table(
+    "comments_archive", _0006,
+    Column("id", Integer, primary_key=True),
+    Column("complaint_id", Integer, ForeignKey("complaints_archive.id"), nullable=False, index=True),
+    Column("author", String(120), nullable=False),
+    Column("text", Text, nullable=False),
+    Column("created_at", DateTime),
+)
+# Referenced by complaints_archive; already created by 0001
+Table("users", _0006, Column("id", Integer, primary_key=True))
+
+
+def _0006_complaint_archive(conn):
+    _create_tables(conn, _0006.tables["complaints_archive"], _0006.tables["comments_archive"])
+
+
+def _0007_notification_archive_ids(conn):
+    # Archived rows keep their notifications id in original_id instead of as their own key
+    _add_columns(conn, "notifications_archive", Column("original_id", Integer, nullable=True))
+    archive = table("notifications_archive", column("id"), column("original_id"))
+    conn.execute(update(archive).where(archive.c.original_id.is_(None)).values(original_id=archive.c.id))
+
+
+def _0008_notification_kinds(conn):
+    _add_columns(conn, "notifications", Column("kind", String(20), nullable=True))
+    _create_indexes(conn, "notifications", ("ix_notifications_complaint_unread", "complaint_id", "is_read"))
+
+
+def _0009_notification_archive_kinds(conn):
+    _add_columns(conn, "notifications_archive", Column("kind", String(20), nullable=True))
+
+
+def _0010_complaint_archive_changes(conn):
+    _create_indexes(conn, "complaints_archive", ("ix_complaints_archive_archived", "archived_at"))
+
+
+MIGRATIONS = [
+    ("0001_initial", _0001_initial),
+    ("0002_hot_path_indexes", _0002_hot_path_indexes),
+    ("0003_jobs", _0003_jobs),
+    ("0004_notification_retention", _0004_notification_retention),
+    ("0005_staff", _0005_staff),
+    ("0006_complaint_archive", _0006_complaint_archive),
+    ("0007_notification_archive_ids", _0007_notification_archive_ids),
+    ("0008_notification_kinds", _0008_notification_kinds),
+    ("0009_notification_archive_kinds", _0009_notification_archive_kinds),
+    ("0010_complaint_archive_changes", _0010_complaint_archive_changes),
+]
+
+
+# ── Runner ──────────────────────────────────────────────
+def applied_versions(bind=engine) -> set[str]:
+    with bind.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return {row[0] for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def upgrade(bind=engine) -> list[str]:
+    """Apply pending migrations and return their versions."""
+    done = applied_versions(bind)
+    ran = []
+    for version, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with bind.begin() as conn:
+            migrate(conn)
+            conn.execute(insert(schema_migrations).values(version=version, applied_at=datetime.utcnow()))
+        ran.append(version)
+    return ran
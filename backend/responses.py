@@ -0,0 +1,44 @@
+"""
+Fast JSON responses.
+FastJSONResponse is the app's default response class: it serializes with
+orjson when installed (datetimes natively, no intermediate str round trip)
+and falls back to compact stdlib json. Hot endpoints return json_response()
+directly, which also skips FastAPI's jsonable_encoder pass over the payload.
+"""
+import json
+from datetime import date, datetime
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:   # optional: stdlib json is used instead
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_response(content, response: Response | None = None) -> FastJSONResponse:
+    """Serialize `content` as-is, keeping headers a handler set on its injected `response`."""
+    out = FastJSONResponse(content)
+    if response is not None:
+        for key, value in response.headers.items():
+            if key not in ("content-length", "content-type"):
+                out.headers.append(key, value)
+    return out
@@ -0,0 +1,75 @@
+"""
+Notification retention.
+Read notifications older than NOTIFY_RETENTION_DAYS are moved to
+notifications_archive (NOTIFY_RETENTION_MODE=archive, the default) or
+deleted (purge), in batches of NOTIFY_RETENTION_BATCH rows so the write
+lock is never held for long. Runs as a periodic background job; rows
+reclaimed are reported on /metrics.
+"""
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete
+from sqlalchemy.orm import Session
+
+from database import Notification, NotificationArchive
+import jobs
+import metrics
+
+NOTIFY_RETENTION_DAYS = float(os.getenv("NOTIFY_RETENTION_DAYS", "90"))
+NOTIFY_RETENTION_MODE = os.getenv("NOTIFY_RETENTION_MODE", "archive")   # archive | purge
+NOTIFY_RETENTION_BATCH = int(os.getenv("NOTIFY_RETENTION_BATCH", "1000"))
+NOTIFY_RETENTION_INTERVAL = float(os.getenv("NOTIFY_RETENTION_INTERVAL", "3600"))   # seconds
+
+# notifications_archive column <- notifications column; the archive numbers its own rows
+ARCHIVE_COLUMNS = {
+    "original_id": Notification.id,
+    "user_id": Notification.user_id,
+    "complaint_id": Notification.complaint_id,
+    "kind": Notification.kind,
+    "message": Notification.message,
+    "is_read": Notification.is_read,
+    "created_at": Notification.created_at,
+}
+
+
+def archive_notifications(db: Session, *where):
+    """Copy the notifications matching `where` into notifications_archive."""
+    db.execute(insert(NotificationArchive).from_select(
+        list(ARCHIVE_COLUMNS), select(*ARCHIVE_COLUMNS.values()).where(*where),
+    ))
+
+
+def reclaim(db: Session, days: float = NOTIFY_RETENTION_DAYS, mode: str = NOTIFY_RETENTION_MODE,
+            batch: int = NOTIFY_RETENTION_BATCH) -> int:
+    """Archive or purge old read notifications, committing per batch. Returns rows reclaimed."""
+    if mode not in ("archive", "purge"):
+        raise ValueError(f"unknown retention mode {mode!r}")
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    total = 0
+    while True:
+        ids = db.scalars(
+            select(Notification.id)
+            .where(Notification.is_read == True, Notification.created_at < cutoff)
+            .order_by(Notification.id)
+            .limit(batch)
+        ).all()
+        if not ids:
+            return total
+        if mode == "archive":
+            archive_notifications(db, Notification.id.in_(ids))
+        db.execute(delete(Notification).where(Notification.id.in_(ids)))
+        jobs.renew_lease(db)
+        db.commit()
+        total += len(ids)
+        metrics.registry.inc(
+            "scms_notifications_reclaimed_total", "Read notifications removed by retention.",
+            len(ids), action=mode,
+        )
+
+
+@jobs.handler("notification-retention")
+def _retention_job(db: Session, payload: dict):
+    reclaim(db)
+
+
+jobs.periodic("notification-retention", NOTIFY_RETENTION_INTERVAL)
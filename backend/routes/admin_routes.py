@@ -1,39 +1,113 @@
-"""Admin-specific routes — stats and staff list."""
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+"""Admin-specific routes — stats, trends and the staff directory."""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
-from database import get_db, Complaint
-from auth import require_admin
+from database import get_async_db, Staff, Complaint, ComplaintArchive
+from auth import require_admin, principal_cache
+from shared_state import call
+import stats
+import staff
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
-STAFF_LIST = ["John Smith", "Maria Garcia", "David Lee", "Sarah Wilson", "James Brown"]
+
+class StaffBody(BaseModel):
+    name: str
+    email: Optional[str] = None
+    categories: list[str] = []
+    buildings: list[str] = []
+    active: bool = True
+
+class StaffPatch(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    categories: Optional[list[str]] = None
+    buildings: Optional[list[str]] = None
+    active: Optional[bool] = None
 
 
 @router.get("/stats")
-def get_stats(
-    db: Session = Depends(get_db),
+async def get_stats(
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(require_admin),
 ):
-    total = db.query(Complaint).count()
-    pending = db.query(Complaint).filter(Complaint.status == "Pending").count()
-    in_progress = db.query(Complaint).filter(Complaint.status == "In Progress").count()
-    resolved = db.query(Complaint).filter(Complaint.status == "Resolved").count()
+    return await stats.get_stats(db)
 
-    # Category breakdown
-    rows = db.query(Complaint.category, func.count(Complaint.id)).group_by(Complaint.category).all()
-    by_category = {row[0]: row[1] for row in rows}
 
-    return {
-        "total": total,
-        "pending": pending,
-        "in_progress": in_progress,
-        "resolved": resolved,
-        "by_category": by_category,
-    }
+@router.get("/stats/trend")
+async def get_trend(
+    bucket: str = Query("day", pattern="^(day|week)$"),
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(require_admin),
+):
+    return await stats.get_trend(db, bucket, days)
 
 
 @router.get("/staff")
-def get_staff(current_user: dict = Depends(require_admin)):
-    return {"staff": STAFF_LIST}
+async def get_staff(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(require_admin),
+):
+    return {"staff": await db.run_sync(staff.live_directory, await staff.directory(db))}
+
+
+async def _save_staff(db: AsyncSession, member: Staff) -> dict:
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(409, "A staff member with that name already exists.")
+    await call(staff.invalidate)
+    await db.refresh(member)
+    return staff.staff_to_dict(member)
+
+
+@router.post("/staff")
+async def create_staff(
+    body: StaffBody,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(require_admin),
+):
+    member = Staff(**body.model_dump())
+    db.add(member)
+    return await _save_staff(db, member)
+
+
+@router.patch("/staff/{staff_id}")
+async def update_staff(
+    staff_id: int,
+    body: StaffPatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(require_admin),
+):
+    member = await db.scalar(select(Staff).where(Staff.id == staff_id))
+    if not member:
+        raise HTTPException(404, "Staff member not found.")
+    # Fields left out stay as they are; email is the only one that can be cleared
+    changes = body.model_dump(exclude_unset=True)
+    for field, value in changes.items():
+        if value is None and field != "email":
+            raise HTTPException(400, f"Staff {field} cannot be empty.")
+    if changes.get("name", member.name) != member.name:
+        # Tickets display the assignee's name, so it follows the rename. Runs before the
+        # member changes, so a duplicate name still fails in _save_staff.
+        for model in (Complaint, ComplaintArchive):
+            await db.execute(
+                update(model).where(model.assigned_staff_id == staff_id)
+                .values(assigned_to=changes["name"], updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+    for field, value in changes.items():
+        setattr(member, field, value)
+    return await _save_staff(db, member)
+
+
+@router.get("/cache-stats")
+async def get_cache_stats(current_user: dict = Depends(require_admin)):
+    return {"principals": principal_cache.stats()}
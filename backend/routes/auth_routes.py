@@ -1,28 +1,28 @@
 """Authentication routes — register, login, admin login."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db, User
-from auth import hash_password, verify_password, create_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, User
+from auth import hash_password_async, verify_and_update_async, create_token
 import models
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
 @router.post("/register")
-def register(data: models.UserRegister, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == data.email).first():
+async def register(data: models.UserRegister, db: AsyncSession = Depends(get_async_db)):
+    if await db.scalar(select(User.id).where(User.email == data.email)):
         raise HTTPException(400, "An account with this email already exists.")
     user = User(
         name=data.name,
         email=data.email,
         student_id=data.student_id,
-        password=hash_password(data.password),
+        password=await hash_password_async(data.password),
         role="student",
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    token = create_token({"sub": str(user.id), "role": "student"})
+    await db.commit()
+    token = create_token({"sub": str(user.id), "role": "student", "name": user.name, "email": user.email})
     return {
         "token": token,
         "user": {"id": user.id, "name": user.name, "email": user.email, "role": "student"},
@@ -30,11 +30,18 @@ def register(data: models.UserRegister, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-def login(data: models.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == data.email).first()
-    if not user or not verify_password(data.password, user.password):
+async def login(data: models.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.email == data.email))
+    if not user:
         raise HTTPException(401, "Invalid email or password.")
-    token = create_token({"sub": str(user.id), "role": user.role})
+    valid, new_hash = await verify_and_update_async(data.password, user.password)
+    if not valid:
+        raise HTTPException(401, "Invalid email or password.")
+    if new_hash:
+        # Stored hash used an old bcrypt cost; upgrade it transparently
+        user.password = new_hash
+        await db.commit()
+    token = create_token({"sub": str(user.id), "role": user.role, "name": user.name, "email": user.email})
     return {
         "token": token,
         "user": {"id": user.id, "name": user.name, "email": user.email, "role": user.role},
@@ -42,7 +49,7 @@ def login(data: models.UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/admin/login")
-def admin_login(data: models.AdminLogin):
+async def admin_login(data: models.AdminLogin):
     if data.username != "admin" or data.password != "admin123":
         raise HTTPException(401, "Invalid administrator credentials.")
     token = create_token({"sub": "admin", "role": "admin"})
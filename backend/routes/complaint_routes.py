@@ -1,16 +1,35 @@
 """
-Complaint routes — submit, list, detail, status update, assign, comments.
+Complaint routes — submit, list, export, detail, status update, assign, comments.
 Auto-generates CF-YYYY-XXXX ticket IDs.
-Creates notifications when admin updates a complaint.
+Queues student notifications (see jobs.py) when admin updates a complaint.
 """
+import base64
+import csv
+import io
+import json
 import os
+import zlib
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response
+from sqlalchemy import select, insert, update, and_, or_, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from pydantic import BaseModel
 from typing import Optional
 
-from database import get_db, Complaint, Comment, Notification, generate_ticket_id, User
+from database import (
+    get_async_db, AsyncSessionLocal, Complaint, Comment, ComplaintArchive, generate_ticket_id, User,
+)
+from search import apply_search
+import stats
+import staff
+from storage import save_upload, thumbnail_url
+from shared_state import call
+import jobs
+from http_cache import make_etag, not_modified, as_utc_naive, delta_watermark
+from responses import json_response
 from auth import get_current_user, require_admin
 
 
@@ -19,15 +38,23 @@ class StatusBody(BaseModel):
     status: str
 
 class AssignBody(BaseModel):
-    assigned_to: str
+    # One of: a staff id, a staff name (older clients), or auto for the least-loaded eligible member
+    staff_id: Optional[int] = None
+    assigned_to: Optional[str] = None
+    auto: bool = False
 
 class CommentBody(BaseModel):
     text: str
 
-router = APIRouter(prefix="/api/complaints", tags=["complaints"])
+class BulkBody(BaseModel):
+    ids: list[int]
+    status: Optional[str] = None
+    staff_id: Optional[int] = None
+    assigned_to: Optional[str] = None
+    auto: bool = False
+    comment: Optional[str] = None
 
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "..", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+router = APIRouter(prefix="/api/complaints", tags=["complaints"])
 
 CAMPUS_BUILDINGS = [
     "Xavier Block",
@@ -37,11 +64,39 @@ CAMPUS_BUILDINGS = [
     "Hostel",
 ]
 
-STAFF_LIST = ["John Smith", "Maria Garcia", "David Lee", "Sarah Wilson", "James Brown"]
+# Attempts to insert a complaint when the ticket number or write lock is contended
+TICKET_RETRIES = 5
 
+# Most complaints one bulk request may touch
+BULK_LIMIT = 500
 
-def _complaint_to_dict(c: Complaint) -> dict:
-    return {
+# Rows fetched per round trip while streaming an export
+EXPORT_BATCH = 500
+EXPORT_FIELDS = [
+    "id", "ticket_id", "student_id", "student_name", "student_email", "category", "building",
+    "room_number", "description", "image_url", "status", "assigned_to", "admin_comment",
+    "created_at", "updated_at",
+]
+
+# Assign new complaints to the least-loaded eligible staff member on submission
+AUTO_ASSIGN_ON_SUBMIT = os.getenv("AUTO_ASSIGN_ON_SUBMIT", "0") == "1"
+
+
+# Loading profiles: detail views need comments, list views only the student.
+DETAIL_LOAD = (joinedload(Complaint.student), selectinload(Complaint.comments))
+SUMMARY_LOAD = (joinedload(Complaint.student),)
+LOAD_PROFILES = {
+    Complaint: (DETAIL_LOAD, SUMMARY_LOAD),
+    ComplaintArchive: (
+        (joinedload(ComplaintArchive.student), selectinload(ComplaintArchive.comments)),
+        (joinedload(ComplaintArchive.student),),
+    ),
+}
+
+
+def _complaint_to_dict(c: Complaint | ComplaintArchive, summary: bool = False) -> dict:
+    # Timestamps stay datetimes; the JSON encoder writes them as ISO 8601
+    data = {
         "id": c.id,
         "ticket_id": c.ticket_id,
         "student_id": c.student_id,
@@ -52,31 +107,61 @@ def _complaint_to_dict(c: Complaint) -> dict:
         "room_number": c.room_number,
         "description": c.description,
         "image_url": c.image_url,
+        "thumbnail_url": thumbnail_url(c.image_url),
         "status": c.status,
         "assigned_to": c.assigned_to,
+        "assigned_staff_id": c.assigned_staff_id,
         "admin_comment": c.admin_comment,
-        "created_at": c.created_at.isoformat() if c.created_at else None,
-        "updated_at": c.updated_at.isoformat() if c.updated_at else None,
-        "comments": [
-            {
-                "id": cm.id,
-                "author": cm.author,
-                "text": cm.text,
-                "created_at": cm.created_at.isoformat() if cm.created_at else None,
-            }
-            for cm in (c.comments or [])
-        ],
+        "created_at": c.created_at,
+        "updated_at": c.updated_at,
+        "archived": isinstance(c, ComplaintArchive),
+        "archived_at": c.archived_at if isinstance(c, ComplaintArchive) else None,
     }
+    if not summary:
+        data["comments"] = [
+            {"id": cm.id, "author": cm.author, "text": cm.text, "created_at": cm.created_at}
+            for cm in (c.comments or [])
+        ]
+    return data
 
 
-def _create_notification(db: Session, user_id: int, complaint: Complaint, message: str):
-    notif = Notification(
-        user_id=user_id,
-        complaint_id=complaint.id,
-        message=message,
-        is_read=False,
-    )
-    db.add(notif)
+def _changed_at(model):
+    """When a row last changed in its table; archived rows only change by being archived."""
+    return model.archived_at if model is ComplaintArchive else model.updated_at
+
+
+def _complaint_query(complaint_id: int, model=Complaint):
+    return select(model).options(*LOAD_PROFILES[model][0]).where(model.id == complaint_id)
+
+
+async def _get_complaint(db: AsyncSession, complaint_id: int, model=Complaint) -> Complaint:
+    c = await db.scalar(_complaint_query(complaint_id, model).execution_options(populate_existing=True))
+    if not c:
+        raise HTTPException(404, "Complaint not found.")
+    return c
+
+
+def _status_message(ticket_id: str, status: str) -> str:
+    return f"Your complaint {ticket_id} status has been updated to '{status}'."
+
+
+def _assign_message(ticket_id: str, assigned_to: str) -> str:
+    return f"Your complaint {ticket_id} has been assigned to {assigned_to}."
+
+
+def _comment_message(ticket_id: str, text: str) -> str:
+    return f"Admin added a comment on your complaint {ticket_id}: \"{text[:80]}{'...' if len(text) > 80 else ''}\""
+
+
+async def _notify(db: AsyncSession, notifications: list[dict]):
+    """Queue {user_id, complaint_id, message} notifications for delivery after commit."""
+    if notifications:
+        await db.run_sync(jobs.enqueue, "notify", {"notifications": notifications})
+
+
+def _notification(c: Complaint, kind: str, message: str) -> dict:
+    """`kind` (status, assign or comment) decides which unread notification a newer one may replace."""
+    return {"user_id": c.student_id, "complaint_id": c.id, "kind": kind, "message": message}
 
 
 # ── Submit Complaint ────────────────────────────────────
@@ -87,141 +172,389 @@ async def submit_complaint(
     room_number: str = Form(...),
     description: str = Form(...),
     image: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     if current_user["role"] == "admin":
         raise HTTPException(403, "Admins cannot submit complaints.")
 
-    image_url = None
+    image_url = rel_path = None
     if image and image.filename:
-        ext = os.path.splitext(image.filename)[1]
-        filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}{ext}"
-        path = os.path.join(UPLOAD_DIR, filename)
-        with open(path, "wb") as f:
-            f.write(await image.read())
-        image_url = f"/uploads/{filename}"
-
-    ticket_id = generate_ticket_id(db)
-    complaint = Complaint(
-        ticket_id=ticket_id,
-        student_id=current_user["id"],
-        category=category,
-        building=building,
-        room_number=room_number,
-        description=description,
-        image_url=image_url,
-        status="Pending",
-    )
-    db.add(complaint)
-    db.commit()
-    db.refresh(complaint)
-    return _complaint_to_dict(complaint)
+        rel_path = await save_upload(image)
+        image_url = f"/uploads/{rel_path}"
+
+    for attempt in range(TICKET_RETRIES):
+        try:
+            complaint = Complaint(
+                ticket_id=await db.run_sync(generate_ticket_id),
+                student_id=current_user["id"],
+                category=category,
+                building=building,
+                room_number=room_number,
+                description=description,
+                image_url=image_url,
+                status="Pending",
+            )
+            db.add(complaint)
+            await db.flush()
+            await db.run_sync(stats.record_new, complaint)
+            if AUTO_ASSIGN_ON_SUBMIT:
+                members = await staff.directory(db)
+                member = await db.run_sync(staff.pick_least_loaded, members, category, building)
+                if member:
+                    await db.run_sync(staff.record_assignment, [complaint], member["id"])
+                    complaint.assigned_staff_id = member["id"]
+                    complaint.assigned_to = member["name"]
+            if rel_path:
+                # Identical uploads share a file, so one thumbnail job per file
+                await db.run_sync(jobs.enqueue, "thumbnail", {"rel_path": rel_path}, f"thumbnail:{rel_path}")
+            complaint_id = complaint.id
+            await db.commit()
+            break
+        except (IntegrityError, OperationalError):
+            await db.rollback()
+            if attempt == TICKET_RETRIES - 1:
+                raise HTTPException(503, "Could not allocate a ticket ID. Please try again.")
+    await call(stats.invalidate)
+    return _complaint_to_dict(await _get_complaint(db, complaint_id))
 
 
 # ── List Complaints ─────────────────────────────────────
+def _encode_cursor(c: Complaint) -> str:
+    raw = f"{c.created_at.isoformat()}|{c.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, cid = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(cid)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Invalid cursor.")
+
+
+def _filtered_complaints(
+    current_user: dict,
+    category: Optional[str],
+    status: Optional[str],
+    search: Optional[str],
+    since: Optional[datetime] = None,
+    ranked: bool = False,
+    model=Complaint,
+):
+    q = select(model)
+    if current_user["role"] != "admin":
+        q = q.filter(model.student_id == current_user["id"])
+    if category:
+        q = q.filter(model.category == category)
+    if status:
+        q = q.filter(model.status == status)
+    if since:
+        q = q.filter(_changed_at(model) > as_utc_naive(since))
+
+    # Full-text search on ticket, student, description and location (admin only)
+    if search and current_user["role"] == "admin":
+        q = apply_search(q, search, ranked=ranked, model=model)
+    return q
+
+
+def _after_cursor(q, model, created_at: datetime, cid: int):
+    """Rows of q after the keyset position (created_at, id), newest first."""
+    return q.filter(or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < cid),
+    ))
+
+
+def _version_query(q):
+    model = q.column_descriptions[0]["entity"]
+    rows = q.order_by(None).subquery()
+    return select(func.count(rows.c.id), func.max(rows.c[_changed_at(model).key]), func.max(rows.c.id))
+
+
+def _page_query(q, limit: Optional[int] = None):
+    model = q.column_descriptions[0]["entity"]
+    stmt = q.options(*LOAD_PROFILES[model][1]).order_by(model.created_at.desc(), model.id.desc())
+    return stmt if limit is None else stmt.limit(limit)
+
+
+async def _result_version(db: AsyncSession, queries: list) -> tuple:
+    """(count, newest change, highest id) over complaint queries."""
+    total, newest, max_id = 0, None, None
+    for q in queries:
+        count, q_newest, q_max_id = (await db.execute(_version_query(q))).one()
+        total += count
+        newest = max(filter(None, (newest, q_newest)), default=None)
+        max_id = max(filter(None, (max_id, q_max_id)), default=None)
+    return total, newest, max_id
+
+
+async def _newest_first(db: AsyncSession, queries: list, limit: Optional[int] = None) -> list:
+    """Summary-loaded rows of the queries, merged newest first by (created_at, id)."""
+    rows = []
+    for q in queries:
+        rows += (await db.scalars(_page_query(q, limit))).all()
+    if len(queries) > 1:
+        rows.sort(key=lambda c: (c.created_at, c.id), reverse=True)
+    return rows if limit is None else rows[:limit]
+
+
 @router.get("")
-def list_complaints(
+async def list_complaints(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     status: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    since: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
-    q = db.query(Complaint)
-    if current_user["role"] != "admin":
-        q = q.filter(Complaint.student_id == current_user["id"])
-    if category:
-        q = q.filter(Complaint.category == category)
-    if status:
-        q = q.filter(Complaint.status == status)
-    complaints = q.order_by(Complaint.created_at.desc()).all()
+    # ?since= returns only complaints changed after the watermark (delta sync), including those
+    # archived since, marked "archived" so clients can drop them from a live-only list.
+    # Archived complaints are otherwise only read on request; merged results are ordered by date, not rank.
+    since = delta_watermark(since)
+    models = (Complaint, ComplaintArchive) if include_archived or since else (Complaint,)
+    queries = [
+        _filtered_complaints(current_user, category, status, search, since,
+                             ranked=limit is None and len(models) == 1, model=model)
+        for model in models
+    ]
+
+    # Full lists and first pages are versioned by one aggregate, which also gives the total
+    total = None
+    if not cursor:
+        total, newest, max_id = await _result_version(db, queries)
+        etag = make_etag(current_user["role"], current_user["id"], total, newest, max_id, request.url.query)
+        cached = not_modified(request, response, etag)
+        if cached:
+            return cached
+
+    # Without a limit, keep returning the full list for the current frontend;
+    # search results are then ordered by relevance first.
+    if limit is None:
+        complaints = await _newest_first(db, queries)
+        return json_response([_complaint_to_dict(c, summary=True) for c in complaints], response)
+
+    # Keyset pagination, newest first, ordered by (created_at, id).
+    # The total is only counted on the first page; clients keep it while paging.
+    if cursor:
+        created_at, cid = _decode_cursor(cursor)
+        queries = [_after_cursor(q, model, created_at, cid) for q, model in zip(queries, models)]
+
+    rows = await _newest_first(db, queries, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return json_response({
+        "items": [_complaint_to_dict(c, summary=True) for c in rows],
+        "next_cursor": _encode_cursor(rows[-1]) if has_more else None,
+        "total": total,
+    }, response)
+
+
+# ── Export ──────────────────────────────────────────────
+def _export_record(c: Complaint) -> dict:
+    return {
+        "id": c.id,
+        "ticket_id": c.ticket_id,
+        "student_id": c.student_id,
+        "student_name": c.student.name if c.student else "",
+        "student_email": c.student.email if c.student else "",
+        "category": c.category,
+        "building": c.building,
+        "room_number": c.room_number,
+        "description": c.description,
+        "image_url": c.image_url,
+        "status": c.status,
+        "assigned_to": c.assigned_to,
+        "admin_comment": c.admin_comment,
+        "created_at": c.created_at.isoformat() if c.created_at else None,
+        "updated_at": c.updated_at.isoformat() if c.updated_at else None,
+    }
+
+
+async def _export_batches(stmt):
+    """Yield lists of complaints from a server-side cursor, EXPORT_BATCH at a time.
+    Uses its own session: the response outlives the request's dependencies."""
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(stmt.execution_options(yield_per=EXPORT_BATCH))
+        async for batch in result.partitions():
+            yield batch
+
+
+async def _csv_chunks(stmt):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    async for batch in _export_batches(stmt):
+        writer.writerows(_export_record(c) for c in batch)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
 
-    # Apply search filter in Python (ticket_id or student name)
-    if search and current_user["role"] == "admin":
-        s = search.lower()
-        complaints = [
-            c for c in complaints
-            if s in c.ticket_id.lower()
-            or (c.student and s in c.student.name.lower())
-            or (c.student and s in c.student.email.lower())
-        ]
 
-    return [_complaint_to_dict(c) for c in complaints]
+async def _jsonl_chunks(stmt):
+    async for batch in _export_batches(stmt):
+        yield "".join(json.dumps(_export_record(c)) + "\n" for c in batch).encode()
+
+
+async def _gzipped(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31: gzip container
+    async for chunk in chunks:
+        data = z.compress(chunk)
+        if data:
+            yield data
+    yield z.flush()
+
+
+@router.get("/export")
+async def export_complaints(
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    since: Optional[datetime] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(require_admin),
+):
+    """Stream every matching complaint, oldest first, as CSV or JSON Lines.
+    created_from is inclusive and created_to exclusive; gzip=true sends a .gz file."""
+    q = _filtered_complaints(current_user, category, status, search, since)
+    if created_from:
+        q = q.filter(Complaint.created_at >= as_utc_naive(created_from))
+    if created_to:
+        q = q.filter(Complaint.created_at < as_utc_naive(created_to))
+    q = q.options(joinedload(Complaint.student)).order_by(Complaint.created_at, Complaint.id)
+
+    chunks = _csv_chunks(q) if format == "csv" else _jsonl_chunks(q)
+    filename = f"complaints-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        chunks = _gzipped(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
 
 
 # ── Complaint Detail ────────────────────────────────────
+def _head_query(complaint_id: int, model=Complaint):
+    """Owner and version of one complaint, checked before it is loaded."""
+    return select(model.student_id, model.updated_at).where(model.id == complaint_id)
+
+
 @router.get("/{complaint_id}")
-def get_complaint(
+async def get_complaint(
     complaint_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
-    c = db.query(Complaint).filter(Complaint.id == complaint_id).first()
-    if not c:
+    # Live complaints first; archived ones are read-only
+    for model in (Complaint, ComplaintArchive):
+        head = (await db.execute(_head_query(complaint_id, model))).first()
+        if head:
+            break
+    else:
         raise HTTPException(404, "Complaint not found.")
-    if current_user["role"] != "admin" and c.student_id != current_user["id"]:
+    if current_user["role"] != "admin" and head.student_id != current_user["id"]:
         raise HTTPException(403, "Access denied.")
-    return _complaint_to_dict(c)
+
+    # Comments and admin actions all bump updated_at
+    etag = make_etag(complaint_id, head.updated_at, model.__tablename__)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+    return json_response(_complaint_to_dict(await _get_complaint(db, complaint_id, model)), response)
 
 
 # ── Update Status ───────────────────────────────────────
 @router.patch("/{complaint_id}/status")
-def update_status(
+async def update_status(
     complaint_id: int,
     body: StatusBody,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(require_admin),
 ):
-    c = db.query(Complaint).filter(Complaint.id == complaint_id).first()
-    if not c:
-        raise HTTPException(404, "Complaint not found.")
+    c = await _get_complaint(db, complaint_id)
     old_status = c.status
+    if old_status != body.status:
+        await db.run_sync(staff.record_status_change, [c], body.status)
     c.status = body.status
     c.updated_at = datetime.utcnow()
     if old_status != body.status:
-        _create_notification(
-            db, c.student_id, c,
-            f"Your complaint {c.ticket_id} status has been updated to '{body.status}'."
-        )
-    db.commit()
-    db.refresh(c)
-    return _complaint_to_dict(c)
+        await db.run_sync(stats.record_status_change, c, old_status)
+        await _notify(db, [_notification(c, "status", _status_message(c.ticket_id, body.status))])
+    await db.commit()
+    await call(stats.invalidate)
+    return _complaint_to_dict(await _get_complaint(db, complaint_id))
 
 
 # ── Assign Complaint ────────────────────────────────────
+def _has_assignee(body) -> bool:
+    return body.auto or body.staff_id is not None or body.assigned_to is not None
+
+
+async def _requested_staff(db: AsyncSession, body) -> dict:
+    """The staff member named by body.staff_id or body.assigned_to."""
+    members = await staff.directory(db)
+    if body.staff_id is not None:
+        member = staff.get_member(members, body.staff_id)
+    else:
+        member = staff.get_member(members, None, body.assigned_to)
+    if member is None:
+        raise HTTPException(404, "Staff member not found.")
+    if not member["active"]:
+        raise HTTPException(400, "Staff member is inactive.")
+    return member
+
+
 @router.patch("/{complaint_id}/assign")
-def assign_complaint(
+async def assign_complaint(
     complaint_id: int,
     body: AssignBody,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(require_admin),
 ):
-    c = db.query(Complaint).filter(Complaint.id == complaint_id).first()
-    if not c:
-        raise HTTPException(404, "Complaint not found.")
-    c.assigned_to = body.assigned_to
+    if not _has_assignee(body):
+        raise HTTPException(400, "No staff member given.")
+    c = await _get_complaint(db, complaint_id)
+    if body.auto:
+        member = await db.run_sync(staff.pick_least_loaded, await staff.directory(db), c.category, c.building)
+        if member is None:
+            raise HTTPException(409, "No active staff member covers this complaint.")
+    else:
+        member = await _requested_staff(db, body)
+    await db.run_sync(staff.record_assignment, [c], member["id"])
+    c.assigned_staff_id = member["id"]
+    c.assigned_to = member["name"]
     c.updated_at = datetime.utcnow()
-    _create_notification(
-        db, c.student_id, c,
-        f"Your complaint {c.ticket_id} has been assigned to {body.assigned_to}."
-    )
-    db.commit()
-    db.refresh(c)
-    return _complaint_to_dict(c)
+    await _notify(db, [_notification(c, "assign", _assign_message(c.ticket_id, member["name"]))])
+    await db.commit()
+    return _complaint_to_dict(await _get_complaint(db, complaint_id))
 
 
 # ── Add Comment ─────────────────────────────────────────
 @router.post("/{complaint_id}/comments")
-def add_comment(
+async def add_comment(
     complaint_id: int,
     body: CommentBody,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(require_admin),
 ):
-    c = db.query(Complaint).filter(Complaint.id == complaint_id).first()
-    if not c:
-        raise HTTPException(404, "Complaint not found.")
+    c = await _get_complaint(db, complaint_id)
 
     comment = Comment(complaint_id=c.id, author="Admin", text=body.text)
     db.add(comment)
@@ -230,10 +563,110 @@ def add_comment(
     c.admin_comment = body.text
     c.updated_at = datetime.utcnow()
 
-    _create_notification(
-        db, c.student_id, c,
-        f"Admin added a comment on your complaint {c.ticket_id}: \"{body.text[:80]}{'...' if len(body.text) > 80 else ''}\""
-    )
-    db.commit()
-    db.refresh(c)
-    return _complaint_to_dict(c)
+    await _notify(db, [_notification(c, "comment", _comment_message(c.ticket_id, body.text))])
+    await db.commit()
+    return _complaint_to_dict(await _get_complaint(db, complaint_id))
+
+
+# ── Bulk Update ─────────────────────────────────────────
+@router.post("/bulk")
+async def bulk_update(
+    body: BulkBody,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(require_admin),
+):
+    """Apply one status/assignment/comment to many complaints in a single
+    transaction. Returns a compact result per requested id."""
+    ids = list(dict.fromkeys(body.ids))
+    if not ids:
+        raise HTTPException(400, "No complaints selected.")
+    if len(ids) > BULK_LIMIT:
+        raise HTTPException(400, f"At most {BULK_LIMIT} complaints can be updated at once.")
+    assigning = _has_assignee(body)
+    if body.status is None and not assigning and body.comment is None:
+        raise HTTPException(400, "Nothing to update.")
+    member = await _requested_staff(db, body) if assigning and not body.auto else None
+
+    rows = (await db.execute(
+        select(
+            Complaint.id, Complaint.ticket_id, Complaint.student_id, Complaint.status,
+            Complaint.category, Complaint.building, Complaint.created_at, Complaint.assigned_staff_id,
+        ).where(Complaint.id.in_(ids))
+    )).all()
+    found = [r.id for r in rows]
+
+    # Assignee per complaint id; auto mode spreads the batch over eligible staff
+    assignees = {}
+    if body.auto:
+        assignees = await db.run_sync(staff.plan_auto_assign, await staff.directory(db), rows)
+    elif member is not None:
+        assignees = {r.id: member for r in rows}
+
+    if found:
+        now = datetime.utcnow()
+        values = {"updated_at": now}
+        if body.status is not None:
+            values["status"] = body.status
+        if body.comment is not None:
+            values["admin_comment"] = body.comment
+        await db.execute(
+            update(Complaint).where(Complaint.id.in_(found)).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        by_member: dict[int, list] = {}
+        for r in rows:
+            if assignees.get(r.id):
+                by_member.setdefault(assignees[r.id]["id"], []).append(r)
+        for staff_id, group in by_member.items():
+            await db.execute(
+                update(Complaint).where(Complaint.id.in_([r.id for r in group]))
+                .values(assigned_staff_id=staff_id, assigned_to=assignees[group[0].id]["name"])
+                .execution_options(synchronize_session=False)
+            )
+            await db.run_sync(staff.record_assignment, group, staff_id)
+        if body.status is not None:
+            # Counters follow each complaint's new assignee, so this runs after the moves
+            moved = {cid: m["id"] for cid, m in assignees.items() if m}
+            await db.run_sync(staff.record_status_change, rows, body.status, moved)
+        if body.comment is not None:
+            await db.execute(insert(Comment), [
+                {"complaint_id": r.id, "author": "Admin", "text": body.comment} for r in rows
+            ])
+        if body.status is not None:
+            await db.run_sync(stats.record_bulk_status_change, rows, body.status)
+
+        # Same notifications the single-complaint endpoints send, delivered by one job
+        notifications = []
+        for r in rows:
+            messages = []
+            if body.status is not None and r.status != body.status:
+                messages.append(("status", _status_message(r.ticket_id, body.status)))
+            if assignees.get(r.id):
+                messages.append(("assign", _assign_message(r.ticket_id, assignees[r.id]["name"])))
+            if body.comment is not None:
+                messages.append(("comment", _comment_message(r.ticket_id, body.comment)))
+            notifications += [
+                {"user_id": r.student_id, "complaint_id": r.id, "kind": k, "message": m} for k, m in messages
+            ]
+        await _notify(db, notifications)
+        await db.commit()
+        if body.status is not None:
+            await call(stats.invalidate)
+
+    by_id = {r.id: r for r in rows}
+    results = []
+    for cid in ids:
+        r = by_id.get(cid)
+        if r is None:
+            results.append({"id": cid, "ok": False, "error": "Complaint not found."})
+            continue
+        result = {
+            "id": cid,
+            "ok": True,
+            "ticket_id": r.ticket_id,
+            "status": body.status if body.status is not None else r.status,
+        }
+        if assigning:
+            result["assigned_to"] = assignees[cid]["name"] if assignees.get(cid) else None
+        results.append(result)
+    return {"updated": len(found), "results": results}
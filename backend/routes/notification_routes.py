@@ -1,47 +1,243 @@
-"""Notification routes for in-app student notifications."""
-from fastapi import APIRouter, Depends
+"""Notification routes for in-app student notifications, including the SSE push stream."""
+import os
+import json
+import asyncio
+from collections import Counter
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, insert, update, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from typing import Optional
 
-from database import get_db, Notification
-from auth import get_current_user
+from database import get_async_db, Notification, NotificationArchive, User
+from auth import get_current_user, create_stream_ticket, redeem_stream_ticket, STREAM_TICKET_SECONDS
+from broker import get_broker, queue_event
+import jobs
+import metrics
+from http_cache import make_etag, not_modified, delta_watermark
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
+KEEPALIVE_SECONDS = 15
+PAGE_SIZE = 20
+
+# Keep at most one unread notification per complaint and kind, holding the latest message
+COALESCE_UNREAD = os.getenv("NOTIFY_COALESCE", "1") == "1"
+
+
+def notification_to_dict(n: Notification) -> dict:
+    return {
+        "id": n.id,
+        "complaint_id": n.complaint_id,
+        "message": n.message,
+        "is_read": n.is_read,
+        "created_at": n.created_at.isoformat() if n.created_at else None,
+    }
+
+
+def _unread_matching(keys):
+    """Unread notifications that could match any (user_id, complaint_id, kind) in keys."""
+    return (
+        select(Notification)
+        .where(
+            Notification.complaint_id.in_({cid for _, cid, _ in keys}),
+            Notification.is_read == False,
+            Notification.user_id.in_({uid for uid, _, _ in keys}),
+            Notification.kind.in_({kind for _, _, kind in keys}),
+        )
+        .order_by(Notification.id)
+    )
+
+
+@jobs.handler("notify")
+def deliver_notifications(db: Session, payload: dict):
+    """Job: store {user_id, complaint_id, kind, message} notifications and push them once
+    committed. An unread notification of the same kind for the complaint is updated instead
+    of adding a row, so a comment never hides a status change."""
+    rows = payload["notifications"]
+    delivered, new_rows = [], rows
+    if COALESCE_UNREAD:
+        latest = {}
+        for n in rows:
+            latest[(n["user_id"], n["complaint_id"], n.get("kind"))] = n
+        keyed = [k for k in latest if k[1] is not None and k[2] is not None]
+        existing = {}
+        if keyed:
+            unread = db.scalars(_unread_matching(keyed))
+            existing = {(n.user_id, n.complaint_id, n.kind): n for n in unread}
+        now = datetime.utcnow()
+        new_rows = []
+        for key, n in latest.items():
+            notif = existing.get(key)
+            if notif is None:
+                new_rows.append(n)
+                continue
+            notif.message = n["message"]
+            notif.created_at = now
+            delivered.append(notif)
+        if len(rows) > len(new_rows):
+            metrics.registry.inc(
+                "scms_notifications_coalesced_total", "Notifications merged into an unread one.",
+                len(rows) - len(new_rows),
+            )
+
+    if new_rows:
+        delivered += db.scalars(
+            insert(Notification).returning(Notification),
+            [dict(n, kind=n.get("kind"), is_read=False) for n in new_rows],
+        ).all()
+        for user_id, n in Counter(n["user_id"] for n in new_rows).items():
+            db.execute(
+                update(User).where(User.id == user_id)
+                .values(unread_notifications=User.unread_notifications + n)
+            )
+    db.flush()
+    for notif in delivered:
+        queue_event(db, notif.user_id, notification_to_dict(notif))
+
+
+def _user_notifications(user_id: int, since: Optional[datetime] = None) -> list:
+    where = [Notification.user_id == user_id]
+    if since:
+        # Delta sync: only notifications created or coalesced after the watermark
+        where.append(Notification.created_at > delta_watermark(since))
+    return where
+
+
+def _archived_since_query(user_id: int, since: datetime):
+    """Ids of the user's notifications moved to the archive after the watermark."""
+    return select(NotificationArchive.original_id).where(
+        NotificationArchive.user_id == user_id, NotificationArchive.archived_at > delta_watermark(since),
+    )
+
+
+def _version_query(where: list):
+    # Covers new rows, coalesced updates and read-state changes
+    return select(
+        func.count(Notification.id),
+        func.max(Notification.id),
+        func.max(Notification.created_at),
+        func.count(Notification.id).filter(Notification.is_read == False),
+    ).where(*where)
+
+
+def _page_query(where: list):
+    return select(Notification).where(*where).order_by(Notification.created_at.desc()).limit(PAGE_SIZE)
+
 
 @router.get("")
-def get_notifications(
-    db: Session = Depends(get_db),
+async def get_notifications(
+    request: Request,
+    response: Response,
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
+    # With ?since=, archived notifications come back as {"id", "archived": true} so clients can
+    # drop them; purged ones were read and past the retention window, which clients can apply too.
     if current_user["role"] == "admin":
         return []
-    notifs = (
-        db.query(Notification)
-        .filter(Notification.user_id == current_user["id"])
-        .order_by(Notification.created_at.desc())
-        .limit(20)
-        .all()
+    where = _user_notifications(current_user["id"], since)
+    count, max_id, newest, unread = (await db.execute(_version_query(where))).one()
+    archived = []
+    if since:
+        archived = (await db.scalars(_archived_since_query(current_user["id"], since))).all()
+    etag = make_etag(current_user["id"], count, max_id, newest, unread, archived, request.url.query)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+
+    notifs = (await db.scalars(_page_query(where))).all()
+    return [notification_to_dict(n) for n in notifs] + [{"id": nid, "archived": True} for nid in archived]
+
+
+@router.get("/unread-count")
+async def get_unread_count(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    if current_user["role"] == "admin":
+        return {"unread": 0}
+    unread = await db.scalar(select(User.unread_notifications).where(User.id == current_user["id"]))
+    return {"unread": unread or 0}
+
+
+# ── Push stream (Server-Sent Events) ────────────────────
+def _sse(event_id: str | None, event: str, data: dict) -> str:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _event_stream(user_id: int, last_event_id: Optional[str]):
+    broker = get_broker()
+    with broker.subscribe(user_id) as queue:
+        seen = 0
+        if last_event_id:
+            missed = broker.replay(user_id, last_event_id)
+            if missed is None:
+                yield _sse(None, "resync", {})
+            else:
+                for evt in missed:
+                    seen = evt.seq
+                    yield _sse(evt.id, "notification", evt.data)
+        while True:
+            try:
+                evt = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if evt.seq > seen:
+                yield _sse(evt.id, "notification", evt.data)
+
+
+@router.post("/stream-ticket")
+async def stream_ticket(current_user: dict = Depends(get_current_user)):
+    # EventSource cannot send an Authorization header, and a session token in the URL would
+    # end up in access logs and browser history, so the stream takes a single-use ticket
+    if current_user["role"] == "admin":
+        raise HTTPException(400, "Notifications are only streamed to students.")
+    return {"ticket": create_stream_ticket(current_user["id"]), "expires_in": STREAM_TICKET_SECONDS}
+
+
+@router.get("/stream")
+async def notification_stream(
+    ticket: str,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    user_id = await redeem_stream_ticket(ticket)
+    return StreamingResponse(
+        _event_stream(user_id, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _mark_all_read_query(user_id: int):
+    return (
+        update(Notification)
+        .where(Notification.user_id == user_id, Notification.is_read == False)
+        .values(is_read=True)
     )
-    return [
-        {
-            "id": n.id,
-            "complaint_id": n.complaint_id,
-            "message": n.message,
-            "is_read": n.is_read,
-            "created_at": n.created_at.isoformat() if n.created_at else None,
-        }
-        for n in notifs
-    ]
 
 
 @router.patch("/read-all")
-def mark_all_read(
-    db: Session = Depends(get_db),
+async def mark_all_read(
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
-    db.query(Notification).filter(
-        Notification.user_id == current_user["id"],
-        Notification.is_read == False,
-    ).update({"is_read": True})
-    db.commit()
+    # The counter says whether there is anything to update at all
+    unread = await db.scalar(select(User.unread_notifications).where(User.id == current_user["id"]))
+    if unread:
+        marked = (await db.execute(_mark_all_read_query(current_user["id"]))).rowcount
+        # Subtract what was marked: a notification delivered since the read above stays counted
+        await db.execute(
+            update(User).where(User.id == current_user["id"])
+            .values(unread_notifications=case(
+                (User.unread_notifications > marked, User.unread_notifications - marked), else_=0,
+            ))
+        )
+        await db.commit()
     return {"ok": True}
@@ -0,0 +1,122 @@
+"""
+Full-text search over complaints.
+On SQLite an FTS5 table (complaints_fts) is kept in sync with the
+complaints and users tables by triggers. Other engines fall back to
+case-insensitive LIKE matching.
+"""
+import re
+from sqlalchemy import Table, Column, Integer, Float, MetaData, or_, func, literal_column, text
+from sqlalchemy.exc import OperationalError
+
+from database import engine, Complaint, User
+
+FTS_TABLE = "complaints_fts"
+
+# Not part of Base.metadata so create_all() never tries to create it
+fts_table = Table(
+    FTS_TABLE, MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("rank", Float),
+)
+
+_fts_ready = False
+
+# Row values for one complaint, looked up from the NEW/OLD trigger row
+_ROW_VALUES = """
+    {ref}.id, {ref}.ticket_id,
+    (SELECT name FROM users WHERE id = {ref}.student_id),
+    (SELECT email FROM users WHERE id = {ref}.student_id),
+    {ref}.description, {ref}.room_number, {ref}.building
+"""
+_COLUMNS = "rowid, ticket_id, student_name, student_email, description, room_number, building"
+
+_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS complaints_fts_ai AFTER INSERT ON complaints BEGIN
+        INSERT INTO {FTS_TABLE}({_COLUMNS}) VALUES ({_ROW_VALUES.format(ref="new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS complaints_fts_au
+    AFTER UPDATE OF ticket_id, student_id, description, room_number, building ON complaints BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}({_COLUMNS}) VALUES ({_ROW_VALUES.format(ref="new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS complaints_fts_ad AFTER DELETE ON complaints BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF name, email ON users BEGIN
+        UPDATE {FTS_TABLE} SET student_name = new.name, student_email = new.email
+        WHERE rowid IN (SELECT id FROM complaints WHERE student_id = new.id);
+    END
+    """,
+]
+
+
+def create_search_index(bind=engine) -> bool:
+    """Create the FTS5 table and triggers, backfilling existing complaints."""
+    global _fts_ready
+    if bind.dialect.name != "sqlite":
+        _fts_ready = False
+        return False
+    try:
+        with bind.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+                {"n": FTS_TABLE},
+            ).first()
+            if not exists:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    "ticket_id, student_name, student_email, description, room_number, building, "
+                    "tokenize = 'unicode61')"
+                ))
+                conn.execute(text(
+                    f"INSERT INTO {FTS_TABLE}({_COLUMNS}) "
+                    f"SELECT {_ROW_VALUES.format(ref='complaints')} FROM complaints"
+                ))
+            for ddl in _TRIGGERS:
+                conn.execute(text(ddl))
+    except OperationalError:
+        # SQLite built without FTS5
+        _fts_ready = False
+        return False
+    _fts_ready = True
+    return True
+
+
+def build_match_query(term: str) -> str | None:
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = re.findall(r"\w+", term.lower())
+    if not words:
+        return None
+    return " AND ".join(f'"{w}"*' for w in words)
+
+
+def apply_search(q, term: str, ranked: bool = False, model=Complaint):
+    """Restrict a Complaint query or select() to rows matching `term`.
+    The index only covers live complaints; other models (the archive) use LIKE."""
+    if _fts_ready and model is Complaint:
+        match = build_match_query(term)
+        if match is None:
+            return q
+        q = q.join(fts_table, fts_table.c.rowid == Complaint.id).filter(
+            literal_column(FTS_TABLE).op("MATCH")(match)
+        )
+        if ranked:
+            q = q.order_by(fts_table.c.rank)
+        return q
+
+    pattern = f"%{term.lower()}%"
+    return q.join(User, model.student_id == User.id).filter(or_(
+        func.lower(model.ticket_id).like(pattern),
+        func.lower(User.name).like(pattern),
+        func.lower(User.email).like(pattern),
+        func.lower(model.description).like(pattern),
+        func.lower(model.room_number).like(pattern),
+        func.lower(model.building).like(pattern),
+    ))
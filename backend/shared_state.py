@@ -0,0 +1,228 @@
+"""
+State shared between worker processes.
+SHARED_STATE=local (the default) keeps caches and counters in process
+memory, which is right for a single worker. SHARED_STATE=sqlite stores them
+in a small SQLite file (SHARED_STATE_PATH) that every worker on the host
+opens, and also switches notification fan-out to broker.SharedBroker.
+Other backends (e.g. Redis) only need to implement SharedState.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import MetaData, Table, Column, String, Integer, Float, Text, select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import DATA_DIR, make_engine
+
+SHARED_STATE = os.getenv("SHARED_STATE", "local")   # local | sqlite
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", os.path.join(DATA_DIR, "shared.db"))
+INIT_LOCK_PATH = os.path.join(DATA_DIR, ".init.lock")
+
+
+# ── Cross-process lock ──────────────────────────────────
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on `path`, held across processes until the block exits."""
+    with open(path, "a+b") as f:
+        if sys.platform == "win32":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:   # LK_LOCK gives up after ~10 s
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ── Backends ────────────────────────────────────────────
+class SharedState:
+    """Interface: a TTL key/value cache, expiring counters and token buckets.
+    Values must be JSON-serializable."""
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str):
+        raise NotImplementedError
+
+    def incr(self, key: str, ttl: float, amount: int = 1) -> int:
+        """Add to a counter that resets `ttl` seconds after it was created; returns the new value."""
+        raise NotImplementedError
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """Take `cost` tokens from a bucket holding up to `burst`, refilled at `rate` per second.
+        Returns 0 if they were taken, otherwise the seconds until enough have refilled."""
+        raise NotImplementedError
+
+
+class LocalState(SharedState):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: dict[str, tuple[float, object]] = {}
+        self._counters: dict[str, list] = {}
+        self._buckets: dict[str, list] = {}
+
+    def get(self, key):
+        hit = self._values.get(key)
+        if hit and hit[0] > time.time():
+            return hit[1]
+        return None
+
+    def set(self, key, value, ttl):
+        self._values[key] = (time.time() + ttl, value)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._values if k.startswith(prefix)]:
+                del self._values[key]
+
+    def incr(self, key, ttl, amount=1):
+        now = time.time()
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None or entry[1] <= now:
+                if len(self._counters) > 10000:
+                    self._counters = {k: e for k, e in self._counters.items() if e[1] > now}
+                entry = self._counters[key] = [0, now + ttl]
+            entry[0] += amount
+            return entry[0]
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    # Buckets that have refilled completely are the same as missing ones
+                    self._buckets = {k: b for k, b in self._buckets.items() if b[0] + (now - b[1]) * rate < burst}
+                bucket = self._buckets[key] = [burst, now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return 0.0
+            bucket[0] = tokens
+            return (cost - tokens) / rate
+
+
+class SQLiteState(SharedState):
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        self.engine = make_engine(f"sqlite:///{path}")
+        self.metadata = MetaData()
+        self.kv = Table(
+            "kv", self.metadata,
+            Column("key", String(200), primary_key=True),
+            Column("value", Text, nullable=False),
+            Column("expires_at", Float, nullable=False),
+        )
+        self.counters = Table(
+            "counters", self.metadata,
+            Column("key", String(200), primary_key=True),
+            Column("count", Integer, nullable=False),
+            Column("expires_at", Float, nullable=False),
+        )
+        self.buckets = Table(
+            "buckets", self.metadata,
+            Column("key", String(200), primary_key=True),
+            Column("tokens", Float, nullable=False),
+            Column("updated_at", Float, nullable=False),
+        )
+        with file_lock(path + ".lock"):
+            self.metadata.create_all(self.engine)
+        self._writes = 0
+
+    def get(self, key):
+        with self.engine.connect() as conn:
+            value = conn.scalar(select(self.kv.c.value).where(self.kv.c.key == key, self.kv.c.expires_at > time.time()))
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        stmt = sqlite_insert(self.kv).values(key=key, value=json.dumps(value), expires_at=now + ttl)
+        with self.engine.begin() as conn:
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["key"], set_={"value": stmt.excluded.value, "expires_at": stmt.excluded.expires_at}))
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                conn.execute(delete(self.kv).where(self.kv.c.expires_at <= now))
+                conn.execute(delete(self.counters).where(self.counters.c.expires_at <= now))
+                conn.execute(delete(self.buckets).where(self.buckets.c.updated_at <= now - 86400))
+
+    def delete_prefix(self, prefix):
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.kv).where(self.kv.c.key.startswith(prefix, autoescape=True)))
+
+    def incr(self, key, ttl, amount=1):
+        now = time.time()
+        c = self.counters.c
+        stmt = sqlite_insert(self.counters).values(key=key, count=amount, expires_at=now + ttl)
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.counters).where(c.key == key, c.expires_at <= now))
+            return conn.execute(
+                stmt.on_conflict_do_update(index_elements=["key"], set_={"count": c.count + amount})
+                .returning(c.count)
+            ).scalar_one()
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        b = self.buckets.c
+        refilled = func.min(burst, b.tokens + (now - b.updated_at) * rate)
+        stmt = sqlite_insert(self.buckets).values(key=key, tokens=burst, updated_at=now)
+        with self.engine.begin() as conn:
+            # The upsert takes the write lock, so the refill and the take are atomic across workers
+            tokens = conn.execute(
+                stmt.on_conflict_do_update(index_elements=["key"], set_={"tokens": refilled, "updated_at": now})
+                .returning(b.tokens)
+            ).scalar_one()
+            if tokens < cost:
+                return (cost - tokens) / rate
+            conn.execute(self.buckets.update().where(b.key == key).values(tokens=b.tokens - cost))
+            return 0.0
+
+
+_state: SharedState | None = None
+
+
+def get_state() -> SharedState:
+    global _state
+    if _state is None:
+        if SHARED_STATE == "sqlite":
+            _state = SQLiteState()
+        elif SHARED_STATE == "local":
+            _state = LocalState()
+        else:
+            raise ValueError(f"unknown SHARED_STATE {SHARED_STATE!r}")
+    return _state
+
+
+def set_state(state: SharedState):
+    global _state
+    _state = state
+
+
+async def call(fn, *args):
+    """Run a state operation from async code. LocalState is a dict lookup; other
+    backends make a file or network round trip, so they run on a worker thread."""
+    if isinstance(get_state(), LocalState):
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
@@ -0,0 +1,150 @@
+"""
+Staff directory and workload-aware assignment.
+Each staff member has an open_tickets counter (assigned complaints that are
+not yet resolved) which complaint routes keep up to date on assignment and
+status changes, so picking the least-loaded member is one indexed query.
+The directory itself changes rarely and is cached in the shared state
+store (see shared_state.py) for STAFF_CACHE_TTL seconds; handlers fetch it
+with directory() and pass it to the assignment helpers.
+"""
+import os
+from collections import Counter
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import Complaint, Staff
+from shared_state import get_state, call
+
+CACHE_TTL = float(os.getenv("STAFF_CACHE_TTL", "300"))   # seconds
+
+CLOSED_STATUSES = {"Resolved"}
+
+
+def staff_to_dict(s: Staff) -> dict:
+    return {
+        "id": s.id,
+        "name": s.name,
+        "email": s.email,
+        "categories": s.categories or [],
+        "buildings": s.buildings or [],
+        "active": s.active,
+        "open_tickets": s.open_tickets,
+    }
+
+
+# ── Directory ───────────────────────────────────────────
+def _load_directory(db: Session) -> list[dict]:
+    return [staff_to_dict(s) for s in db.scalars(select(Staff).order_by(Staff.name))]
+
+
+async def directory(db: AsyncSession) -> list[dict]:
+    """All staff members, cached; open_tickets may be up to CACHE_TTL stale."""
+    state = get_state()
+    value = await call(state.get, "staff:directory")
+    if value is None:
+        value = await db.run_sync(_load_directory)
+        await call(state.set, "staff:directory", value, CACHE_TTL)
+    return value
+
+
+def invalidate():
+    get_state().delete_prefix("staff:")
+
+
+def live_directory(db: Session, members: list[dict]) -> list[dict]:
+    """The directory with current open-ticket counts."""
+    counts = dict(db.execute(select(Staff.id, Staff.open_tickets)).all())
+    return [dict(s, open_tickets=counts.get(s["id"], 0)) for s in members if s["id"] in counts]
+
+
+def get_member(members: list[dict], staff_id: int | None = None, name: str | None = None) -> dict | None:
+    for s in members:
+        if s["id"] == staff_id or (name is not None and s["name"] == name):
+            return s
+    return None
+
+
+def _eligible(s: dict, category: str, building: str) -> bool:
+    return (
+        s["active"]
+        and (not s["categories"] or category in s["categories"])
+        and (not s["buildings"] or building in s["buildings"])
+    )
+
+
+def pick_least_loaded(db: Session, members: list[dict], category: str, building: str) -> dict | None:
+    """The active member covering category and building with the fewest open tickets."""
+    ids = [s["id"] for s in members if _eligible(s, category, building)]
+    if not ids:
+        return None
+    staff_id = db.scalar(
+        select(Staff.id).where(Staff.id.in_(ids)).order_by(Staff.open_tickets, Staff.id).limit(1)
+    )
+    return get_member(members, staff_id)
+
+
+def plan_auto_assign(db: Session, members: list[dict], rows) -> dict[int, dict | None]:
+    """Least-loaded member for each of `rows` (carrying id, category, building),
+    counting the complaints planned so far. Reads the counters once."""
+    members = live_directory(db, members)
+    load = {s["id"]: s["open_tickets"] for s in members}
+    plan = {}
+    for r in rows:
+        eligible = [s for s in members if _eligible(s, r.category, r.building)]
+        best = min(eligible, key=lambda s: (load[s["id"]], s["id"]), default=None)
+        if best is not None:
+            load[best["id"]] += 1
+        plan[r.id] = best
+    return plan
+
+
+# ── Counter maintenance ─────────────────────────────────
+def _adjust(db: Session, deltas: Counter):
+    for staff_id, delta in deltas.items():
+        if staff_id is not None and delta:
+            db.execute(
+                update(Staff).where(Staff.id == staff_id)
+                .values(open_tickets=Staff.open_tickets + delta)
+                .execution_options(synchronize_session=False)
+            )
+
+
+def _is_open(status: str) -> bool:
+    return status not in CLOSED_STATUSES
+
+
+def record_assignment(db: Session, rows, new_staff_id: int):
+    """Move complaints onto new_staff_id. `rows` carry assigned_staff_id (the old one) and status.
+    Runs in the caller's transaction."""
+    deltas = Counter()
+    for r in rows:
+        if r.assigned_staff_id != new_staff_id and _is_open(r.status):
+            deltas[r.assigned_staff_id] -= 1
+            deltas[new_staff_id] += 1
+    _adjust(db, deltas)
+
+
+def record_status_change(db: Session, rows, new_status: str, reassigned: dict[int, int] | None = None):
+    """Adjust assignees' counters for complaints moving to new_status. `rows` carry id,
+    assigned_staff_id and status (the old ones); `reassigned` maps complaint ids to the
+    staff they were moved to earlier in the transaction. Runs in the caller's transaction."""
+    reassigned = reassigned or {}
+    deltas = Counter()
+    for r in rows:
+        was, now = _is_open(r.status), _is_open(new_status)
+        if was != now:
+            deltas[reassigned.get(r.id, r.assigned_staff_id)] += 1 if now else -1
+    _adjust(db, deltas)
+
+
+def rebuild_counters(db: Session):
+    """Recompute every open_tickets counter from the complaints table."""
+    open_count = (
+        select(func.count(Complaint.id))
+        .where(Complaint.assigned_staff_id == Staff.id, Complaint.status.not_in(CLOSED_STATUSES))
+        .scalar_subquery()
+    )
+    db.execute(update(Staff).values(open_tickets=open_count))
+    db.commit()
+    invalidate()
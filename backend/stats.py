@@ -0,0 +1,202 @@
+"""
+Complaint statistics for the admin dashboard.
+Counts come from the complaint_counters table, which complaint routes keep
+up to date on every submission and status change, and are cached for a
+short TTL in the shared state store (see shared_state.py), so every worker
+sees the same figures and invalidation. Set STATS_COUNTERS=0 to aggregate the complaints
+table directly instead. Either way archived complaints are counted too.
+"""
+import os
+from datetime import date, timedelta
+from sqlalchemy import func, case, insert, select, update, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Complaint, ComplaintArchive, ComplaintCounter
+from shared_state import get_state, call
+
+USE_COUNTERS = os.getenv("STATS_COUNTERS", "1") == "1"
+CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "30"))   # seconds
+
+STATUSES = {"Pending": "pending", "In Progress": "in_progress", "Resolved": "resolved"}
+
+# ── Cache ───────────────────────────────────────────────
+async def _cached(key: str, compute):
+    """The cached value for key, awaiting compute() on a miss."""
+    state = get_state()
+    value = await call(state.get, f"stats:{key}")
+    if value is None:
+        value = await compute()
+        await call(state.set, f"stats:{key}", value, CACHE_TTL)
+    return value
+
+
+def invalidate():
+    get_state().delete_prefix("stats:")
+
+
+# ── Counter maintenance ─────────────────────────────────
+def _bump(db: Session, day: date, status: str, category: str, building: str, delta: int):
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        # One statement, so two first writes to a counter cannot both insert it
+        upsert = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(ComplaintCounter).values(
+            day=day, status=status, category=category, building=building, count=delta,
+        )
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=["day", "status", "category", "building"],
+            set_={"count": ComplaintCounter.count + delta},
+        ))
+        return
+    key = (
+        (ComplaintCounter.day == day)
+        & (ComplaintCounter.status == status)
+        & (ComplaintCounter.category == category)
+        & (ComplaintCounter.building == building)
+    )
+    result = db.execute(
+        update(ComplaintCounter)
+        .where(key)
+        .values(count=ComplaintCounter.count + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.add(ComplaintCounter(
+            day=day, status=status, category=category, building=building, count=delta,
+        ))
+        db.flush()
+
+
+def record_new(db: Session, c: Complaint):
+    """Count a newly flushed complaint. Runs in the caller's transaction."""
+    if USE_COUNTERS:
+        _bump(db, c.created_at.date(), c.status, c.category, c.building, 1)
+
+
+def record_status_change(db: Session, c: Complaint, old_status: str):
+    """Move a complaint between status counters. Runs in the caller's transaction."""
+    if USE_COUNTERS and old_status != c.status:
+        day = c.created_at.date()
+        _bump(db, day, old_status, c.category, c.building, -1)
+        _bump(db, day, c.status, c.category, c.building, 1)
+
+
+def record_bulk_status_change(db: Session, rows, new_status: str):
+    """Move many complaints to new_status, one counter update per group.
+    `rows` carry created_at, status (the old one), category and building."""
+    if not USE_COUNTERS:
+        return
+    deltas: dict = {}
+    for r in rows:
+        if r.status == new_status:
+            continue
+        day = r.created_at.date()
+        for status, delta in ((r.status, -1), (new_status, 1)):
+            key = (day, status, r.category, r.building)
+            deltas[key] = deltas.get(key, 0) + delta
+    for (day, status, category, building), delta in deltas.items():
+        if delta:
+            _bump(db, day, status, category, building, delta)
+
+
+def _all_complaints():
+    """Live and archived complaints as one subquery of the columns statistics use."""
+    return union_all(*(
+        select(m.id, m.created_at, m.status, m.category, m.building) for m in (Complaint, ComplaintArchive)
+    )).subquery()
+
+
+def rebuild_counters(db: Session):
+    """Recompute every counter from the live and archived complaints."""
+    rows = _all_complaints()
+    day = func.date(rows.c.created_at)
+    db.query(ComplaintCounter).delete()
+    db.execute(insert(ComplaintCounter).from_select(
+        ["day", "status", "category", "building", "count"],
+        select(day, rows.c.status, rows.c.category, rows.c.building, func.count())
+        .group_by(day, rows.c.status, rows.c.category, rows.c.building),
+    ))
+    db.commit()
+    invalidate()
+
+
+def init_counters():
+    """Backfill counters on startup for databases created before they existed."""
+    if not USE_COUNTERS:
+        return
+    db = SessionLocal()
+    try:
+        if db.query(ComplaintCounter).first() is None and db.query(Complaint).first() is not None:
+            rebuild_counters(db)
+    finally:
+        db.close()
+
+
+# ── Queries ─────────────────────────────────────────────
+def _summary(rows) -> dict:
+    """Fold (status, category, building, count) rows into the stats payload."""
+    stats = {"total": 0, "pending": 0, "in_progress": 0, "resolved": 0,
+             "by_category": {}, "by_building": {}}
+    for status, category, building, count in rows:
+        if not count:
+            continue
+        stats["total"] += count
+        if status in STATUSES:
+            stats[STATUSES[status]] += count
+        stats["by_category"][category] = stats["by_category"].get(category, 0) + count
+        stats["by_building"][building] = stats["by_building"].get(building, 0) + count
+    return stats
+
+
+def compute_stats(db: Session) -> dict:
+    if USE_COUNTERS:
+        src = ComplaintCounter
+        total = func.sum(ComplaintCounter.count)
+    else:
+        src = _all_complaints().c
+        total = func.count(src.id)
+    rows = (
+        db.query(src.status, src.category, src.building, total)
+        .group_by(src.status, src.category, src.building)
+        .all()
+    )
+    return _summary(rows)
+
+
+def compute_trend(db: Session, bucket: str = "day", days: int = 30) -> list[dict]:
+    """Submitted and resolved counts per day or ISO week, by submission date."""
+    since = date.today() - timedelta(days=days - 1)
+
+    if USE_COUNTERS:
+        day = ComplaintCounter.day
+        submitted = func.sum(ComplaintCounter.count)
+        resolved = func.sum(case((ComplaintCounter.status == "Resolved", ComplaintCounter.count), else_=0))
+        q = (db.query(day, submitted, resolved)
+             .filter(ComplaintCounter.day >= since))
+    else:
+        rows = _all_complaints().c
+        day = func.date(rows.created_at)
+        submitted = func.count(rows.id)
+        resolved = func.sum(case((rows.status == "Resolved", 1), else_=0))
+        q = (db.query(day, submitted, resolved)
+             .filter(rows.created_at >= since))
+
+    buckets: dict[date, dict] = {}
+    for d, sub, res in q.group_by(day).all():
+        if isinstance(d, str):
+            d = date.fromisoformat(d)
+        if bucket == "week":
+            d = d - timedelta(days=d.weekday())
+        b = buckets.setdefault(d, {"period": d.isoformat(), "submitted": 0, "resolved": 0})
+        b["submitted"] += sub or 0
+        b["resolved"] += res or 0
+    return [buckets[k] for k in sorted(buckets)]
+
+
+async def get_stats(db: AsyncSession) -> dict:
+    return await _cached("stats", lambda: db.run_sync(compute_stats))
+
+
+async def get_trend(db: AsyncSession, bucket: str = "day", days: int = 30) -> list[dict]:
+    return await _cached(f"trend:{bucket}:{days}", lambda: db.run_sync(compute_trend, bucket, days))
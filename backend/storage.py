@@ -0,0 +1,223 @@
+"""
+Image upload storage.
+Uploads are streamed to disk in chunks off the event loop, capped at
+MAX_UPLOAD_BYTES and checked against known image signatures.
+UploadLimitMiddleware caps multipart request bodies as they are received,
+before Starlette spools them to a temporary file. Files are
+content-addressed: stored under their SHA-256 in sharded directories, so a
+re-uploaded photo reuses the existing blob. Downscaled JPEG thumbnails are
+generated in the background when Pillow is installed.
+"""
+import os
+import time
+import uuid
+import hashlib
+from fastapi import HTTPException, UploadFile
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.concurrency import run_in_threadpool
+
+from database import Complaint, ComplaintArchive
+import jobs
+from responses import FastJSONResponse
+
+try:
+    from PIL import Image
+except ImportError:   # thumbnails are skipped without Pillow
+    Image = None
+
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+THUMB_DIR = os.path.join(UPLOAD_DIR, "thumbs")
+INCOMING_DIR = os.path.join(UPLOAD_DIR, ".incoming")
+os.makedirs(THUMB_DIR, exist_ok=True)
+os.makedirs(INCOMING_DIR, exist_ok=True)
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+# Room for the other form fields and multipart framing around the image
+FORM_OVERHEAD_BYTES = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+THUMB_SIZE = (320, 320)
+
+# Leading bytes -> extension for the image types we accept
+_SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+]
+
+
+def sniff_image(head: bytes) -> str | None:
+    """Return the file extension for a supported image, or None."""
+    for magic, ext in _SIGNATURES:
+        if head.startswith(magic):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def blob_path(digest: str, ext: str) -> str:
+    """Relative path of a blob: ab/cd/abcd....ext"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def _commit_blob(tmp_path: str, rel_path: str):
+    dest = os.path.join(UPLOAD_DIR, rel_path)
+    if os.path.exists(dest):
+        os.remove(tmp_path)   # identical content already stored
+        # The blob may be unreferenced until this upload's complaint commits, so
+        # restart its garbage-collection grace period (and its thumbnail's)
+        os.utime(dest)
+        thumb = os.path.join(THUMB_DIR, _thumb_name(os.path.basename(rel_path)))
+        if os.path.exists(thumb):
+            os.utime(thumb)
+        return
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(tmp_path, dest)
+
+
+async def save_upload(upload: UploadFile) -> str:
+    """Stream an uploaded image into the blob store and return its relative path."""
+    head = await upload.read(CHUNK_SIZE)
+    ext = sniff_image(head)
+    if ext is None:
+        raise HTTPException(415, "Only JPEG, PNG, GIF or WebP images can be uploaded.")
+
+    tmp_path = os.path.join(INCOMING_DIR, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        size = 0
+        chunk = head
+        while chunk:
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(413, f"Image exceeds the {MAX_UPLOAD_BYTES // 1024} KB upload limit.")
+            digest.update(chunk)
+            await run_in_threadpool(f.write, chunk)
+            chunk = await upload.read(CHUNK_SIZE)
+    except BaseException:
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(os.remove, tmp_path)
+        raise
+    await run_in_threadpool(f.close)
+
+    rel_path = blob_path(digest.hexdigest(), ext)
+    await run_in_threadpool(_commit_blob, tmp_path, rel_path)
+    return rel_path
+
+
+class UploadLimitMiddleware:
+    """Rejects multipart bodies larger than an upload plus its form fields: up front when
+    Content-Length says so, otherwise as soon as the received bytes pass the limit."""
+
+    def __init__(self, app, limit: int = MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/"):
+            return await self.app(scope, receive, send)
+        too_large = HTTPException(413, f"Image exceeds the {MAX_UPLOAD_BYTES // 1024} KB upload limit.")
+        length = headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.limit:
+            response = FastJSONResponse({"detail": too_large.detail}, status_code=413,
+                                        headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    raise too_large   # rendered as a 413 by the app's exception handling
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# ── Thumbnails ──────────────────────────────────────────
+def _thumb_name(filename: str) -> str:
+    return os.path.splitext(filename)[0] + ".jpg"
+
+
+def thumbnail_url(image_url: str | None) -> str | None:
+    if not image_url:
+        return None
+    return f"/uploads/thumbs/{_thumb_name(os.path.basename(image_url))}"
+
+
+def make_thumbnail(rel_path: str):
+    """Write a downscaled JPEG for an uploaded image. Run by the "thumbnail" job."""
+    if Image is None:
+        return
+    src = os.path.join(UPLOAD_DIR, rel_path)
+    dest = os.path.join(THUMB_DIR, _thumb_name(os.path.basename(rel_path)))
+    if os.path.exists(dest):
+        return
+    try:
+        with Image.open(src) as im:
+            im.thumbnail(THUMB_SIZE)
+            im.convert("RGB").save(dest, "JPEG", quality=80, optimize=True)
+    except (OSError, ValueError):
+        pass   # corrupt or unsupported image; views fall back to the original
+
+
+@jobs.handler("thumbnail")
+def _thumbnail_job(db, payload: dict):
+    make_thumbnail(payload["rel_path"])
+
+
+# ── Serving ─────────────────────────────────────────────
+class UploadStaticFiles(StaticFiles):
+    """StaticFiles for /uploads; stored files never change, so cache them for a year."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# ── Garbage collection ──────────────────────────────────
+def collect_garbage(db, grace_seconds: int = 24 * 3600, dry_run: bool = False) -> list[str]:
+    """
+    Delete uploads and thumbnails no complaint references.
+    Files younger than grace_seconds are kept so uploads whose complaint
+    has not committed yet are never removed. Returns the removed paths.
+    """
+    referenced = {
+        url[len("/uploads/"):]
+        for m in (Complaint, ComplaintArchive)
+        for (url,) in db.query(m.image_url).filter(m.image_url.isnot(None)).distinct()
+    }
+    referenced_thumbs = {_thumb_name(os.path.basename(p)) for p in referenced}
+    cutoff = time.time() - grace_seconds
+    removed = []
+
+    for root, _dirs, files in os.walk(UPLOAD_DIR):
+        for name in files:
+            full = os.path.join(root, name)
+            rel = os.path.relpath(full, UPLOAD_DIR).replace(os.sep, "/")
+            if rel.startswith("thumbs/"):
+                live = name in referenced_thumbs
+            else:
+                live = rel in referenced
+            if live or os.path.getmtime(full) > cutoff:
+                continue
+            removed.append(rel)
+            if not dry_run:
+                os.remove(full)
+
+    if not dry_run:
+        # Drop shard directories left empty
+        for root, _dirs, _files in os.walk(UPLOAD_DIR, topdown=False):
+            if root not in (UPLOAD_DIR, THUMB_DIR, INCOMING_DIR) and not os.listdir(root):
+                os.rmdir(root)
+    return removed
@@ -0,0 +1,94 @@
+"""
+The app runs in-process against a fresh SQLite database for the test
+session, with rate limiting off, cheap password hashes and no job workers
+(tests run jobs with jobs.drain()). Settings are read at import time, so
+they are set before anything from the app is imported.
+"""
+import contextvars
+import itertools
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="scms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'scms.db')}"
+os.environ["SHARED_STATE_PATH"] = os.path.join(_tmp, "shared.db")
+os.environ["RATE_LIMITS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["JOB_WORKERS"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+
+_students = itertools.count(1)
+_statements: contextvars.ContextVar = contextvars.ContextVar("test_statements", default=None)
+
+
+def _record_statement(conn, cursor, statement, *args):
+    statements = _statements.get()
+    if statements is not None:
+        statements.append(statement)
+
+
+class SQLRecorder:
+    """ASGI wrapper keeping the SQL the latest request executed in `last`.
+    Statements run by background jobs are not part of any request."""
+
+    def __init__(self, app):
+        self.app = app
+        self.last: list[str] = []
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.last = []
+        _statements.set(self.last)
+        await self.app(scope, receive, send)
+
+
+@pytest.fixture(scope="session")
+def sql() -> SQLRecorder:
+    from sqlalchemy import event
+    from database import engine, async_engine
+    from main import app
+    for eng in (engine, async_engine.sync_engine) if async_engine else (engine,):
+        event.listen(eng, "before_cursor_execute", _record_statement)
+    return SQLRecorder(app)
+
+
+@pytest.fixture(scope="session")
+def client(sql):
+    with TestClient(sql) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client) -> dict:
+    r = client.post("/api/auth/admin/login", json={"username": "admin", "password": "admin123"})
+    return {"Authorization": f"Bearer {r.json()['token']}"}
+
+
+@pytest.fixture(scope="session")
+def new_student(client):
+    """Registers a student and returns their auth headers."""
+    def register() -> dict:
+        n = next(_students)
+        r = client.post("/api/auth/register", json={
+            "name": f"Student {n}", "email": f"student{n}@example.edu", "student_id": f"S{n:05d}", "password": "pw",
+        })
+        assert r.status_code == 200, r.text
+        return {"Authorization": f"Bearer {r.json()['token']}"}
+    return register
+
+
+@pytest.fixture
+def student_headers(new_student) -> dict:
+    return new_student()
+
+
+@pytest.fixture(scope="session")
+def submit(client):
+    """Submits a complaint as the given student; fields override the defaults."""
+    def post(headers: dict, **fields):
+        data = {"category": "Electricity", "building": "Hostel A", "room_number": "101", "description": "No power."}
+        return client.post("/api/complaints", data=dict(data, **fields), headers=headers)
+    return post
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import admission
+from auth import create_stream_ticket
+import shared_state
+
+
+async def _login(request):
+    return JSONResponse({"email": (await request.json())["email"]})
+
+
+@pytest.fixture
+def login_client(monkeypatch):
+    """An app behind RateLimitMiddleware: 3 logins per IP and account, 5 per IP."""
+    monkeypatch.setattr(admission, "RATE_LIMITS", True)
+    monkeypatch.setitem(admission.LIMITS, "login", (3 / 60, 3))
+    monkeypatch.setitem(admission.LIMITS, "login_ip", (5 / 60, 5))
+    monkeypatch.setattr(shared_state, "_state", shared_state.LocalState())
+    app = Starlette(routes=[Route("/api/auth/login", _login, methods=["POST"])])
+    return TestClient(admission.RateLimitMiddleware(app))
+
+
+def _login_status(client, email: str) -> int:
+    r = client.post("/api/auth/login", json={"email": email, "password": "wrong"})
+    if r.status_code == 200:
+        assert r.json()["email"] == email   # the body still reaches the app
+    return r.status_code
+
+
+def test_failed_logins_lock_out_one_account_not_the_whole_address(login_client):
+    assert [_login_status(login_client, "a@example.edu") for _ in range(4)] == [200, 200, 200, 429]
+    assert _login_status(login_client, "B@example.edu") == 200
+
+
+def test_one_address_still_has_an_overall_login_limit(login_client):
+    statuses = [_login_status(login_client, f"user{i}@example.edu") for i in range(6)]
+    assert statuses == [200] * 5 + [429]
+
+
+def test_open_streams_are_capped_per_user():
+    closed = asyncio.Event()
+
+    async def stream(scope, receive, send):
+        await closed.wait()
+
+    middleware = admission.ConcurrencyLimitMiddleware(stream, streams=2)
+
+    async def open_stream(user_id: int) -> list:
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http", "method": "GET", "path": "/api/notifications/stream", "client": ("10.0.0.1", 1),
+            "headers": [], "query_string": f"ticket={create_stream_ticket(user_id)}".encode(),
+        }
+        await middleware(scope, None, send)
+        return sent
+
+    async def scenario():
+        held = [asyncio.create_task(open_stream(1)) for _ in range(2)]
+        await asyncio.sleep(0)
+        rejected = await open_stream(1)
+        other_user = asyncio.create_task(open_stream(2))
+        await asyncio.sleep(0)
+        assert not other_user.done()
+        closed.set()
+        await asyncio.gather(*held, other_user)
+        return rejected
+
+    rejected = asyncio.run(scenario())
+    assert rejected[0]["status"] == 429
+    assert not middleware._open_streams   # closed streams give their slot back
@@ -0,0 +1,44 @@
+"""?since= deltas miss no row that commits late, and report rows archived since the watermark."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from archival import _archive_batch
+from database import SessionLocal, Complaint
+import jobs
+
+
+def _ids(rows) -> dict:
+    return {r["id"]: r.get("archived", False) for r in rows}
+
+
+def test_rows_stamped_before_the_watermark_but_committed_later_are_sent(client, student_headers, submit):
+    late = submit(student_headers).json()
+    newer = submit(student_headers).json()
+    watermark = newer["updated_at"]
+    # `late` was stamped before `newer` but only became visible after the client synced
+    with SessionLocal() as db:
+        stamped = datetime.fromisoformat(watermark) - timedelta(seconds=5)
+        db.execute(update(Complaint).where(Complaint.id == late["id"]).values(updated_at=stamped))
+        db.commit()
+
+    rows = client.get("/api/complaints", params={"since": watermark}, headers=student_headers).json()
+    assert late["id"] in _ids(rows)
+
+
+def test_archived_complaints_and_notifications_are_reported_as_removed(
+    client, admin_headers, student_headers, submit,
+):
+    cid = submit(student_headers).json()["id"]
+    client.patch(f"/api/complaints/{cid}/status", json={"status": "Resolved"}, headers=admin_headers)
+    assert jobs.drain()
+    complaint = client.get(f"/api/complaints/{cid}", headers=student_headers).json()
+    notification = client.get("/api/notifications", headers=student_headers).json()[0]
+    with SessionLocal() as db:
+        _archive_batch(db, [cid])
+        db.commit()
+
+    rows = client.get("/api/complaints", params={"since": complaint["updated_at"]}, headers=student_headers).json()
+    assert _ids(rows)[cid] is True
+    notifs = client.get("/api/notifications", params={"since": notification["created_at"]}, headers=student_headers)
+    assert {"id": notification["id"], "archived": True} in notifs.json()
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from database import SessionLocal, Job
+import jobs
+
+
+def _add_job(**values) -> int:
+    with SessionLocal() as db:
+        job = Job(kind="test-lease", payload={}, **values)
+        db.add(job)
+        db.commit()
+        return job.id
+
+
+def test_expired_job_without_attempts_left_is_failed_not_retried(client):
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    job_id = _add_job(status="running", attempts=3, max_attempts=3, locked_until=expired)
+    assert jobs.drain()
+    with SessionLocal() as db:
+        assert db.get(Job, job_id).status == "running"
+        assert jobs.fail_abandoned(db) == 1
+        db.commit()
+        assert db.get(Job, job_id).status == "failed"
+
+
+def test_handlers_renew_their_lease_between_batches(client, monkeypatch):
+    leases = []
+
+    def lease(db):
+        return db.scalar(select(Job.locked_until).where(Job.kind == "test-lease", Job.status == "running"))
+
+    @jobs.handler("test-lease")
+    def long_job(db, payload):
+        leases.append(lease(db))   # taken when the job was claimed
+        monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 3600)
+        jobs.renew_lease(db)
+        db.commit()
+        leases.append(lease(db))
+
+    job_id = _add_job(status="queued", max_attempts=1)
+    assert jobs.drain()
+    assert leases[0] < datetime.utcnow() + timedelta(minutes=5) < leases[1]
+    with SessionLocal() as db:
+        assert db.get(Job, job_id).status == "done"
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from auth import redeem_stream_ticket
+from database import SessionLocal, NotificationArchive
+from retention import reclaim
+import jobs
+
+
+def _ticket(client, headers) -> str:
+    r = client.post("/api/notifications/stream-ticket", headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()["ticket"]
+
+
+def test_stream_does_not_accept_the_session_token(client, student_headers):
+    session_token = student_headers["Authorization"][len("Bearer "):]
+    assert client.get("/api/notifications/stream", params={"token": session_token}).status_code == 422
+    assert client.get("/api/notifications/stream", params={"ticket": session_token}).status_code == 401
+
+
+def test_stream_ticket_is_not_a_session_token(client, student_headers):
+    ticket = _ticket(client, student_headers)
+    r = client.get("/api/notifications", headers={"Authorization": f"Bearer {ticket}"})
+    assert r.status_code == 401
+
+
+def test_stream_ticket_is_single_use(client, student_headers):
+    ticket = _ticket(client, student_headers)
+    user_id = asyncio.run(redeem_stream_ticket(ticket))
+    assert user_id > 0
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(redeem_stream_ticket(ticket))
+    assert exc.value.status_code == 401
+
+
+def test_admins_get_no_stream_ticket(client, admin_headers):
+    assert client.post("/api/notifications/stream-ticket", headers=admin_headers).status_code == 400
+
+
+def _unread(client, headers) -> int:
+    return client.get("/api/notifications/unread-count", headers=headers).json()["unread"]
+
+
+def test_read_all_keeps_later_notifications_counted(client, admin_headers, student_headers, submit):
+    cid = submit(student_headers).json()["id"]
+    client.patch(f"/api/complaints/{cid}/status", json={"status": "In Progress"}, headers=admin_headers)
+    client.post(f"/api/complaints/{cid}/comments", json={"text": "On it."}, headers=admin_headers)
+    assert jobs.drain()
+    assert _unread(client, student_headers) == 2
+
+    client.patch("/api/notifications/read-all", headers=student_headers)
+    assert _unread(client, student_headers) == 0
+    client.patch(f"/api/complaints/{cid}/status", json={"status": "Resolved"}, headers=admin_headers)
+    assert jobs.drain()
+    assert _unread(client, student_headers) == 1
+
+
+def test_archived_notifications_keep_their_kind(client, admin_headers, student_headers, submit):
+    cid = submit(student_headers).json()["id"]
+    client.patch(f"/api/complaints/{cid}/status", json={"status": "In Progress"}, headers=admin_headers)
+    client.post(f"/api/complaints/{cid}/comments", json={"text": "On it."}, headers=admin_headers)
+    assert jobs.drain()
+    client.patch("/api/notifications/read-all", headers=student_headers)
+
+    with SessionLocal() as db:
+        reclaim(db, days=0)
+        kinds = set(db.scalars(select(NotificationArchive.kind).where(NotificationArchive.complaint_id == cid)))
+    assert kinds == {"status", "comment"}
@@ -0,0 +1,59 @@
+"""Each endpoint runs a fixed number of SQL statements, however many rows it returns."""
+import pytest
+
+
+def _count(client, sql, method: str, url: str, headers: dict, **kw) -> int:
+    r = client.request(method, url, headers=headers, **kw)
+    assert r.status_code == 200, r.text
+    return len(sql.last)
+
+
+@pytest.fixture(scope="module")
+def student(client, admin_headers, new_student, submit):
+    """A student with 30 complaints; every other one has three admin comments."""
+    headers = new_student()
+    ids = [submit(headers).json()["id"] for _ in range(30)]
+    for cid in ids[::2]:
+        for _ in range(3):
+            client.post(f"/api/complaints/{cid}/comments", json={"text": "Looking into it."}, headers=admin_headers)
+    client.get("/api/notifications/unread-count", headers=headers)   # caches the principal
+    return headers, ids
+
+
+@pytest.mark.parametrize("query", ["?limit=1", "?limit=10", "?limit=50", ""])
+def test_list(client, sql, admin_headers, student, query):
+    headers, _ = student
+    # ETag version aggregate, then the page
+    assert _count(client, sql, "GET", f"/api/complaints{query}", admin_headers) == 2
+    assert _count(client, sql, "GET", f"/api/complaints{query}", headers) == 2
+
+
+def test_detail(client, sql, admin_headers, student):
+    _, ids = student
+    for cid in ids[:2]:   # with and without comments
+        # ETag check, the complaint joined with its student, then its comments
+        assert _count(client, sql, "GET", f"/api/complaints/{cid}", admin_headers) == 3
+
+
+def test_admin_mutations(client, sql, admin_headers, student):
+    _, ids = student
+    mutations = [
+        ("PATCH", "status", {"status": "In Progress"}, 8),
+        ("PATCH", "assign", {"auto": True}, 8),
+        ("POST", "comments", {"text": "Fixed."}, 7),
+    ]
+    # The first assignment fills the staff cache
+    for method, action, body, _ in mutations:
+        client.request(method, f"/api/complaints/{ids[-1]}/{action}", headers=admin_headers, json=body)
+    for cid in ids[2:4]:   # with and without comments
+        for method, action, body, expected in mutations:
+            assert _count(client, sql, method, f"/api/complaints/{cid}/{action}", admin_headers, json=body) == expected
+
+
+def test_student_endpoints(client, sql, student, submit):
+    headers, _ = student
+    assert _count(client, sql, "GET", "/api/notifications", headers) == 2
+    assert _count(client, sql, "GET", "/api/notifications/unread-count", headers) == 1
+    r = submit(headers)
+    assert r.status_code == 200
+    assert len(sql.last) == 5
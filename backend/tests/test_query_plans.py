@@ -0,0 +1,15 @@
+"""Every hot endpoint query is answered from an index, as `manage.py explain` checks."""
+from database import SessionLocal
+import manage
+
+
+def test_hot_queries_use_an_index(client):
+    # The client fixture has run startup: the schema is migrated and the search index exists
+    db = SessionLocal()
+    try:
+        results = manage.query_plans(db)
+    finally:
+        db.close()
+    assert len(results) == len(manage._hot_queries())
+    scans = {name: plan for name, plan, full_scan in results if full_scan}
+    assert scans == {}
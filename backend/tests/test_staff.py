@@ -0,0 +1,30 @@
+def test_update_staff_clears_email_and_renames_assigned_tickets(client, admin_headers, student_headers, submit):
+    r = client.post("/api/admin/staff", json={"name": "Alex Kim", "email": "alex@example.edu"}, headers=admin_headers)
+    assert r.status_code == 200, r.text
+    staff_id = r.json()["id"]
+    cid = submit(student_headers).json()["id"]
+    client.patch(f"/api/complaints/{cid}/assign", json={"staff_id": staff_id}, headers=admin_headers)
+
+    r = client.patch(f"/api/admin/staff/{staff_id}", json={"name": "Alex Kim-Lee", "email": None},
+                     headers=admin_headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["name"] == "Alex Kim-Lee" and r.json()["email"] is None
+    complaint = client.get(f"/api/complaints/{cid}", headers=admin_headers).json()
+    assert complaint["assigned_to"] == "Alex Kim-Lee"
+
+
+def test_update_staff_rejects_clearing_required_fields(client, admin_headers):
+    staff_id = client.post("/api/admin/staff", json={"name": "Sam Ortiz"}, headers=admin_headers).json()["id"]
+    r = client.patch(f"/api/admin/staff/{staff_id}", json={"name": None}, headers=admin_headers)
+    assert r.status_code == 400
+
+
+def test_renaming_to_a_taken_name_changes_nothing(client, admin_headers, student_headers, submit):
+    staff_id = client.post("/api/admin/staff", json={"name": "Jo Park"}, headers=admin_headers).json()["id"]
+    client.post("/api/admin/staff", json={"name": "Jo Parker"}, headers=admin_headers)
+    cid = submit(student_headers).json()["id"]
+    client.patch(f"/api/complaints/{cid}/assign", json={"staff_id": staff_id}, headers=admin_headers)
+
+    r = client.patch(f"/api/admin/staff/{staff_id}", json={"name": "Jo Parker"}, headers=admin_headers)
+    assert r.status_code == 409
+    assert client.get(f"/api/complaints/{cid}", headers=admin_headers).json()["assigned_to"] == "Jo Park"
@@ -0,0 +1,37 @@
+from datetime import date
+
+import pytest
+
+from archival import _archive_batch
+from database import SessionLocal, ComplaintCounter
+import stats
+
+
+@pytest.fixture
+def archived(client, admin_headers, student_headers, submit):
+    """Archives one resolved complaint, which both stats modes keep counting."""
+    cid = submit(student_headers, category="Internet").json()["id"]
+    client.patch(f"/api/complaints/{cid}/status", json={"status": "Resolved"}, headers=admin_headers)
+    with SessionLocal() as db:
+        _archive_batch(db, [cid])
+        db.commit()
+
+
+def test_counter_and_aggregate_modes_agree(archived, monkeypatch):
+    with SessionLocal() as db:
+        from_counters = stats.compute_stats(db), stats.compute_trend(db, "day", 7)
+        monkeypatch.setattr(stats, "USE_COUNTERS", False)
+        aggregated = stats.compute_stats(db), stats.compute_trend(db, "day", 7)
+    assert from_counters == aggregated
+    assert from_counters[0]["by_category"]["Internet"] >= 1
+
+
+def test_counter_upserts_add_up():
+    key = dict(day=date(2001, 1, 1), status="Pending", category="Water", building="Hostel")
+    for _ in range(2):
+        with SessionLocal() as db:
+            stats._bump(db, delta=1, **key)
+            stats._bump(db, delta=2, **key)
+            db.commit()
+    with SessionLocal() as db:
+        assert db.get(ComplaintCounter, tuple(key.values())).count == 6
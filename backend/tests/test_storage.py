@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+
+import storage
+from database import SessionLocal
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def upload_dir(client, tmp_path, monkeypatch):
+    """Blob store in a temporary directory; `client` makes sure the schema exists."""
+    monkeypatch.setattr(storage, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(storage, "THUMB_DIR", str(tmp_path / "thumbs"))
+    monkeypatch.setattr(storage, "INCOMING_DIR", str(tmp_path / ".incoming"))
+    os.makedirs(tmp_path / "thumbs")
+    os.makedirs(tmp_path / ".incoming")
+    return tmp_path
+
+
+def _store(content: bytes, rel_path: str):
+    tmp = os.path.join(storage.INCOMING_DIR, "upload.part")
+    with open(tmp, "wb") as f:
+        f.write(content)
+    storage._commit_blob(tmp, rel_path)
+
+
+def test_reused_blob_is_not_collected_before_its_complaint_commits(upload_dir):
+    rel = storage.blob_path("ab" * 32, ".png")
+    _store(PNG, rel)
+    thumb = os.path.join(storage.THUMB_DIR, storage._thumb_name(os.path.basename(rel)))
+    open(thumb, "wb").close()
+    old = time.time() - 2 * DAY
+    for path in (upload_dir / rel, thumb):
+        os.utime(path, (old, old))
+
+    _store(PNG, rel)   # the same photo uploaded again
+    assert not os.listdir(storage.INCOMING_DIR)
+
+    with SessionLocal() as db:
+        assert storage.collect_garbage(db, grace_seconds=DAY) == []
+    assert (upload_dir / rel).exists() and os.path.exists(thumb)
+
+
+def test_unreferenced_blob_is_collected_after_the_grace_period(upload_dir):
+    rel = storage.blob_path("cd" * 32, ".png")
+    _store(PNG, rel)
+    old = time.time() - 2 * DAY
+    os.utime(upload_dir / rel, (old, old))
+
+    with SessionLocal() as db:
+        assert storage.collect_garbage(db, grace_seconds=DAY) == [rel]
+    assert not (upload_dir / rel).exists()
+    assert not (upload_dir / "cd").exists()   # empty shard directories are dropped
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import func
+
+from database import SessionLocal, Complaint, ComplaintArchive, TicketSequence, User, _seed_ticket_sequence
+
+SUBMISSIONS = 300
+CLIENTS = 32
+
+
+def _number(ticket_id: str) -> int:
+    return int(ticket_id.rsplit("-", 1)[1])
+
+
+def test_concurrent_submissions_get_unique_gap_free_ids(new_student, submit):
+    students = [new_student() for _ in range(20)]
+
+    def one(i):
+        r = submit(students[i % len(students)])
+        assert r.status_code == 200, r.text
+        return r.json()["ticket_id"]
+
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        ids = list(pool.map(one, range(SUBMISSIONS)))
+
+    assert len(set(ids)) == SUBMISSIONS
+    assert len({i.rsplit("-", 1)[0] for i in ids}) == 1   # one year prefix
+    numbers = sorted(map(_number, ids))
+    assert numbers == list(range(numbers[0], numbers[0] + SUBMISSIONS))
+
+
+def test_ticket_ids_follow_on_after_existing_ones(student_headers, submit):
+    first = _number(submit(student_headers).json()["ticket_id"])
+    second = _number(submit(student_headers).json()["ticket_id"])
+    assert second == first + 1
+
+
+def test_sequence_is_seeded_past_archived_tickets(new_student):
+    new_student()
+    row = dict(category="Water", building="Hostel A", room_number="101", description="Leak.",
+               status="Resolved", created_at=datetime(2099, 1, 1), updated_at=datetime(2099, 1, 1))
+    with SessionLocal() as db:
+        student_id = db.query(func.max(User.id)).scalar()
+        db.add(Complaint(ticket_id="CF-2099-0007", student_id=student_id, **row))
+        db.add(ComplaintArchive(id=99999, ticket_id="CF-2099-0042", student_id=student_id, **row))
+        db.commit()
+        _seed_ticket_sequence(db, 2099, "CF-2099-")
+        db.commit()
+        assert db.get(TicketSequence, 2099).last_value == 42
@@ -1,6 +1,7 @@
 // ─── Admin Dashboard Logic ───
 
 let allComplaints = [];
+let _complaintsWatermark = null;
 let staffList = [];
 let activeComplaintId = null;
 let _searchQuery = "";
@@ -77,9 +78,19 @@ async function loadDashboard() {
 // ── Complaints Table ─────────────────────────────────────
 async function loadComplaints() {
   const tbody = document.getElementById("complaints-tbody");
-  tbody.innerHTML = `<tr><td colspan="8" style="text-align:center;padding:30px;"><div class="spinner" style="margin:0 auto;"></div></td></tr>`;
+  if (!_complaintsWatermark) {
+    tbody.innerHTML = `<tr><td colspan="8" style="text-align:center;padding:30px;"><div class="spinner" style="margin:0 auto;"></div></td></tr>`;
+  }
   try {
-    allComplaints = await apiFetch("/api/complaints");
+    // After the first load only fetch complaints changed since the last one
+    if (_complaintsWatermark) {
+      const changed = await apiFetch(`/api/complaints?since=${encodeURIComponent(_complaintsWatermark)}`);
+      allComplaints = mergeById(allComplaints, changed);
+      _complaintsWatermark = latestUpdate(changed, _complaintsWatermark);
+    } else {
+      allComplaints = await apiFetch("/api/complaints");
+      _complaintsWatermark = latestUpdate(allComplaints);
+    }
     renderComplaintsTable(allComplaints);
   } catch (e) {
     tbody.innerHTML = `<tr><td colspan="8" class="no-data"><p>${e.message}</p></td></tr>`;
@@ -165,7 +176,10 @@ async function openComplaintModal(id) {
 
 function renderComplaintModal(c) {
   const body = document.getElementById("modal-body");
-  const staffOptions = staffList.map(s => `<option value="${s}" ${c.assigned_to === s ? "selected" : ""}>${s}</option>`).join("");
+  const staffOptions = staffList
+    .filter(s => s.active || c.assigned_staff_id === s.id)
+    .map(s => `<option value="${s.id}" ${c.assigned_staff_id === s.id ? "selected" : ""}>${s.name} (${s.open_tickets} open)</option>`)
+    .join("");
 
   body.innerHTML = `
     <div class="modal-section">
@@ -198,7 +212,7 @@ function renderComplaintModal(c) {
     ${c.image_url ? `
       <div class="modal-section">
         <h4>Attached Image</h4>
-        <img src="http://127.0.0.1:8000${c.image_url}" style="border-radius:var(--radius-sm);max-height:220px;object-fit:cover;width:100%;" />
+        <a href="http://127.0.0.1:8000${c.image_url}" target="_blank"><img src="http://127.0.0.1:8000${c.thumbnail_url || c.image_url}" onerror="this.onerror=null;this.src='http://127.0.0.1:8000${c.image_url}'" style="border-radius:var(--radius-sm);max-height:220px;object-fit:cover;width:100%;" /></a>
       </div>` : ""}
 
     <div class="modal-section">
@@ -216,6 +230,7 @@ function renderComplaintModal(c) {
           <label class="form-label">Assign To</label>
           <select id="action-assign" class="form-control">
             <option value="">-- Select Staff Member --</option>
+            <option value="auto">Auto-assign (least loaded)</option>
             ${staffOptions}
           </select>
         </div>
@@ -264,13 +279,14 @@ async function saveActions() {
       await apiFetch(`/api/complaints/${activeComplaintId}/assign`, {
         method: "PATCH",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ assigned_to: assignTo })
+        body: JSON.stringify(assignTo === "auto" ? { auto: true } : { staff_id: Number(assignTo) })
       });
     }
 
     showToast("Complaint updated successfully.");
     await loadComplaints();
     await loadDashboard();
+    await loadStaff();
     openComplaintModal(activeComplaintId);
   } catch (e) {
     showToast(e.message, "error");
@@ -59,6 +59,24 @@ function formatDate(iso) {
     });
 }
 
+// ── Delta sync ───────────────────────────────────────────
+// Merge rows returned by a ?since= request into a cached list (newest first).
+// Rows archived since the last request come back marked archived and are dropped.
+function mergeById(list, changed) {
+    const byId = new Map(list.map(x => [x.id, x]));
+    changed.forEach(x => x.archived ? byId.delete(x.id) : byId.set(x.id, x));
+    return [...byId.values()].sort((a, b) =>
+        (b.created_at || "").localeCompare(a.created_at || "") || b.id - a.id);
+}
+
+// Newest change (update or archival) in a list, used as the next ?since= watermark
+function latestUpdate(list, since = null) {
+    return list.reduce((max, x) => {
+        const changed = x.archived_at || x.updated_at;
+        return (changed && changed > (max || "")) ? changed : max;
+    }, since);
+}
+
 // ── Status badge ─────────────────────────────────────────
 function statusBadge(status) {
     const map = {
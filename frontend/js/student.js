@@ -1,6 +1,7 @@
 // ─── Student Dashboard Logic ───
 
 let _allComplaints = [];  // cache for client-side filtering
+let _complaintsWatermark = null;
 let _statusFilter = "all";
 
 document.addEventListener("DOMContentLoaded", () => {
@@ -61,9 +62,17 @@ function setFilter(filter) {
 // ── My Complaints ───────────────────────────────────────
 async function loadMyComplaints() {
   const container = document.getElementById("complaints-list");
-  container.innerHTML = '<div class="spinner"></div>';
+  if (!_complaintsWatermark) container.innerHTML = '<div class="spinner"></div>';
   try {
-    _allComplaints = await apiFetch("/api/complaints");
+    // After the first load only fetch complaints changed since the last one
+    if (_complaintsWatermark) {
+      const changed = await apiFetch(`/api/complaints?since=${encodeURIComponent(_complaintsWatermark)}`);
+      _allComplaints = mergeById(_allComplaints, changed);
+      _complaintsWatermark = latestUpdate(changed, _complaintsWatermark);
+    } else {
+      _allComplaints = await apiFetch("/api/complaints");
+      _complaintsWatermark = latestUpdate(_allComplaints);
+    }
     renderComplaints(_allComplaints);
   } catch (e) {
     container.innerHTML = `<div class="no-data"><p>Failed to load complaints: ${e.message}</p></div>`;
@@ -146,7 +155,7 @@ async function showComplaintDetail(id) {
       ${c.image_url ? `
         <div class="modal-section">
           <h4>Attached Image</h4>
-          <img src="http://127.0.0.1:8000${c.image_url}" style="border-radius:var(--radius-sm);max-height:220px;object-fit:cover;" />
+          <a href="http://127.0.0.1:8000${c.image_url}" target="_blank"><img src="http://127.0.0.1:8000${c.thumbnail_url || c.image_url}" onerror="this.onerror=null;this.src='http://127.0.0.1:8000${c.image_url}'" style="border-radius:var(--radius-sm);max-height:220px;object-fit:cover;" /></a>
         </div>` : ""}
       <div class="modal-section">
         <h4>Admin Comments (${c.comments.length})</h4>
@@ -236,10 +245,15 @@ function setupSubmitForm() {
 
 // ── Notifications ────────────────────────────────────────
 let _notifPollHandle = null;
+let _notifSource = null;
+let _notifRetryHandle = null;
+let _notifLastEventId = null;
+let _notifs = [];
+let _unread = 0;
 
 async function setupNotifications() {
+  startNotificationStream();
   await refreshNotifications();
-  _notifPollHandle = setInterval(refreshNotifications, 30000);
 
   const bell = document.getElementById("notif-bell");
   const panel = document.getElementById("notif-panel");
@@ -247,6 +261,8 @@ async function setupNotifications() {
     panel.classList.toggle("open");
     if (panel.classList.contains("open")) {
       await apiFetch("/api/notifications/read-all", { method: "PATCH" });
+      _notifs.forEach(n => n.is_read = true);
+      _unread = 0;
       document.getElementById("notif-badge").style.display = "none";
       document.getElementById("notif-badge").textContent = "";
     }
@@ -259,20 +275,64 @@ async function setupNotifications() {
   });
 }
 
+// Server pushes new notifications; fall back to polling without EventSource
+async function startNotificationStream() {
+  if (!window.EventSource) {
+    _notifPollHandle = setInterval(refreshNotifications, 30000);
+    return;
+  }
+  // The stream URL takes a single-use ticket, never the session token
+  let ticket;
+  try {
+    ticket = await apiFetch("/api/notifications/stream-ticket", { method: "POST" });
+  } catch (_) {
+    _notifRetryHandle = setTimeout(startNotificationStream, 10000);
+    return;
+  }
+  if (!ticket) return;
+  const resume = _notifLastEventId ? `&last_event_id=${encodeURIComponent(_notifLastEventId)}` : "";
+  _notifSource = new EventSource(`${API_BASE}/api/notifications/stream?ticket=${encodeURIComponent(ticket.ticket)}${resume}`);
+  _notifSource.addEventListener("notification", e => {
+    _notifLastEventId = e.lastEventId;
+    const n = JSON.parse(e.data);
+    // A repeat update on a complaint reuses its unread notification: move it to the top
+    const prev = _notifs.find(x => x.id === n.id);
+    if (!prev || prev.is_read) _unread++;
+    _notifs = [n, ..._notifs.filter(x => x.id !== n.id)].slice(0, 20);
+    renderNotifications();
+  });
+  // Missed events could not be replayed (e.g. server restart): reload the list
+  _notifSource.addEventListener("resync", refreshNotifications);
+  // The browser would reconnect with the used ticket, so reconnect with a fresh one instead
+  _notifSource.addEventListener("error", () => {
+    _notifSource.close();
+    _notifRetryHandle = setTimeout(startNotificationStream, 3000);
+  });
+}
+
 async function refreshNotifications() {
   try {
-    const notifs = await apiFetch("/api/notifications");
+    const [notifs, count] = await Promise.all([
+      apiFetch("/api/notifications"),
+      apiFetch("/api/notifications/unread-count"),
+    ]);
     if (!notifs) return;
-    const unread = notifs.filter(n => !n.is_read).length;
-    const badge = document.getElementById("notif-badge");
-    if (badge) {
-      badge.textContent = unread > 0 ? (unread > 9 ? "9+" : unread) : "";
-      badge.style.display = unread > 0 ? "flex" : "none";
-    }
-    renderNotifPanel(notifs);
+    _notifs = notifs;
+    _unread = count ? count.unread : notifs.filter(n => !n.is_read).length;
+    renderNotifications();
   } catch (_) { }
 }
 
+function renderNotifications() {
+  const unread = _unread;
+  const badge = document.getElementById("notif-badge");
+  if (badge) {
+    badge.textContent = unread > 0 ? (unread > 9 ? "9+" : unread) : "";
+    badge.style.display = unread > 0 ? "flex" : "none";
+  }
+  renderNotifPanel(_notifs);
+}
+
 function renderNotifPanel(notifs) {
   const list = document.getElementById("notif-list");
   if (!list) return;
@@ -292,6 +352,8 @@ function renderNotifPanel(notifs) {
 function setupLogout() {
   document.getElementById("logout-btn")?.addEventListener("click", () => {
     clearInterval(_notifPollHandle);
+    clearTimeout(_notifRetryHandle);
+    _notifSource?.close();
     clearAuth();
     window.location.href = "index.html";
   });